@@ -0,0 +1,257 @@
+"""
+Benchmark ponta a ponta: N clientes simultâneos conversando com o virtKino, sem GPU e sem internet.\\
+Tudo que é externo é falso, com latência configurável: o Ollama (benchmarks/ollamaFalso.py), o Whisper
+(benchmarks/whisperFalso.py: o "áudio" enviado é o próprio texto) e o TTS. O catálogo é um CSV sintético
+com o formato do TMDB (benchmarks/datasetSintetico.py), do tamanho que for pedido.\\
+Modos:
+- direto: cada cliente é uma thread chamando processarIntencao (só lógica: LLM + recomendador)
+- ws: cada cliente é um WebSocket no /ws do servidor real, mandando a fala em frames binários
+  (transcrição em lote, LLM em streaming, TTS frase a frase)
+
+Mede vazão, latência do turno (p50/p95/p99), tempo até o primeiro áudio e o custo médio de cada etapa
+(os 'tempos' do debug de cada resposta).\\
+Com --limite-p95 / --min-vazao, sai com código 1 se o resultado piorar além do limite (para gate de regressão).
+
+Uso (na raiz do projeto):
+    python -m benchmarks.bench_e2e --modo ws --clientes 16 --turnos 5 --linhas 100000
+    python -m benchmarks.bench_e2e --modo direto --limite-p95 2000 --json resultado.json
+"""
+import argparse
+import asyncio
+import contextlib
+import concurrent.futures
+import tempfile
+import shutil
+import json
+import time
+import sys
+import io
+import os
+
+import numpy as np
+
+from benchmarks.datasetSintetico import gerarDataset
+from benchmarks.ollamaFalso import OllamaFalso
+from benchmarks.whisperFalso import instalarWhisperFalso
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FRASES = [
+    "me recomenda um filme de terror com zumbis",
+    "oi, tudo bem?",
+    "quero assistir uma comédia romântica dos anos 90",
+    "qual o seu filme favorito?",
+    "um filme de ficção científica com robôs",
+    "e um de ação com assalto?",
+]
+
+def prepararDiretorio(diretorio: str, linhas: int):
+    """
+    Monta um diretório de trabalho isolado (dataset sintético, logs, caches) com os caminhos relativos
+    que o servidor espera, para o benchmark não tocar nos arquivos do projeto
+    """
+    os.makedirs(os.path.join(diretorio, "dataset"), exist_ok=True)
+    os.makedirs(os.path.join(diretorio, "static"), exist_ok=True)
+    os.makedirs(os.path.join(diretorio, "source/front/virtkino-front/dist/assets"), exist_ok=True)
+    if not os.path.exists(os.path.join(diretorio, "configs")):
+        shutil.copytree(os.path.join(RAIZ, "configs"), os.path.join(diretorio, "configs"))
+
+    csv = os.path.join(diretorio, "dataset", "tmdb_5000_movies.csv")
+    marcador = os.path.join(diretorio, "dataset", "linhas.txt")
+    if not os.path.exists(marcador) or open(marcador).read() != str(linhas):
+        print(f"[INFO] Gerando catálogo sintético com {linhas} filmes")
+        gerarDataset(csv, linhas)
+        with open(marcador, 'w') as f:
+            f.write(str(linhas))
+
+def instalarTTSFalso(latencia: float):
+    import source.back.yapper as yapper
+
+    async def sintetizarFalso(texto: str) -> bytes:
+        await asyncio.sleep(latencia)
+        return b"ID3" + texto.encode("utf-8")
+
+    yapper._sintetizarEdge = sintetizarFalso
+
+def desligarCaches():
+    """
+    Cada turno paga o custo inteiro: sem cache de interpretação, de ranking ou de TTS
+    """
+    from source.back.cacheRecomendacao import cache_interpretacoes, cache_recomendacoes
+    from source.back.cacheAudio import cache_audio
+    cache_interpretacoes.max_itens = 0
+    cache_recomendacoes.max_itens = 0
+    cache_audio.obter = lambda chave: None
+    cache_audio.guardar = lambda chave, audio: None
+
+def rodarDireto(clientes: int, turnos: int) -> tuple:
+    from source.back.yapper import processarIntencao
+    from source.back.dbManager import carregarDataframe
+    from source.back.classificadorRapido import treinarClassificador
+    from source.back.metricas import iniciarTurno, finalizarTurno
+    from source.back.sessoes import sessoes
+
+    df = carregarDataframe()
+    treinarClassificador()
+
+    def cliente(numero: int) -> list:
+        sessao = sessoes.obter()
+        resultados = []
+        for i in range(turnos):
+            turno = iniciarTurno()
+            inicio = time.perf_counter()
+            processarIntencao(FRASES[(numero + i) % len(FRASES)], df, sessao)
+            resultados.append({"latencia_ms": (time.perf_counter() - inicio) * 1000, "tempos": finalizarTurno(turno)})
+        return resultados
+
+    inicio = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(clientes) as pool:
+        resultados = [r for lista in pool.map(cliente, range(clientes)) for r in lista]
+    return resultados, time.perf_counter() - inicio
+
+def rodarWebsocket(clientes: int, turnos: int) -> tuple:
+    from fastapi.testclient import TestClient
+    import server
+
+    def cliente(http, numero: int) -> list:
+        resultados = []
+        with http.websocket_connect("/ws") as ws:
+            ws.receive_json() # id da sessão
+            for i in range(turnos):
+                inicio = time.perf_counter()
+                primeiro_audio = None
+                ws.send_bytes(FRASES[(numero + i) % len(FRASES)].encode("utf-8"))
+                while True:
+                    mensagem = ws.receive()
+                    if mensagem.get("bytes") is not None:
+                        primeiro_audio = primeiro_audio or time.perf_counter()
+                        continue
+                    dados = json.loads(mensagem["text"])
+                    if dados.get("tipo") == "resposta" or dados.get("valor") == "idle":
+                        if dados.get("audio_binario"):
+                            ws.receive_bytes()
+                            primeiro_audio = primeiro_audio or time.perf_counter()
+                        break
+                fim = time.perf_counter()
+                resultados.append({
+                    "latencia_ms": (fim - inicio) * 1000,
+                    "primeiro_audio_ms": ((primeiro_audio or fim) - inicio) * 1000,
+                    "tempos": dados.get("debug", {}).get("tempos")
+                })
+        return resultados
+
+    with TestClient(server.app) as http:
+        inicio = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(clientes) as pool:
+            resultados = [r for lista in pool.map(lambda n: cliente(http, n), range(clientes)) for r in lista]
+    return resultados, time.perf_counter() - inicio
+
+def percentis(valores: list) -> dict:
+    if not valores: return {}
+    return {f"p{p}": round(float(np.percentile(valores, p)), 1) for p in (50, 95, 99)}
+
+def resumir(resultados: list, duracao: float) -> dict:
+    completos = [r for r in resultados if r["tempos"]]
+    etapas = {}
+    for r in completos:
+        for etapa, ms in r["tempos"]["etapas_ms"].items():
+            etapas.setdefault(etapa, []).append(ms)
+    resumo = {
+        "turnos": len(resultados),
+        "sem_resposta": len(resultados) - len(completos),
+        "duracao_s": round(duracao, 2),
+        "vazao_turnos_s": round(len(resultados) / duracao, 2),
+        "latencia_ms": percentis([r["latencia_ms"] for r in resultados]),
+        "llm_chamadas_por_turno": round(float(np.mean([r["tempos"]["llm"]["chamadas"] for r in completos])), 2) if completos else 0,
+        # Média por turno (turnos que não passaram pela etapa contam 0) e p95 de quem passou
+        "etapas_ms": {etapa: {"media": round(sum(valores) / max(len(completos), 1), 1), "p95": percentis(valores)["p95"], "turnos": len(valores)}
+                      for etapa, valores in sorted(etapas.items())}
+    }
+    if any("primeiro_audio_ms" in r for r in resultados):
+        resumo["primeiro_audio_ms"] = percentis([r["primeiro_audio_ms"] for r in resultados])
+    return resumo
+
+def imprimir(modo: str, resumo: dict):
+    print(f"\n== {modo}: {resumo['turnos']} turnos em {resumo['duracao_s']} s ({resumo['vazao_turnos_s']} turnos/s)")
+    latencia = resumo["latencia_ms"]
+    print(f"Latência do turno (ms): p50 {latencia['p50']}  p95 {latencia['p95']}  p99 {latencia['p99']}")
+    if "primeiro_audio_ms" in resumo:
+        audio = resumo["primeiro_audio_ms"]
+        print(f"Primeiro áudio (ms):    p50 {audio['p50']}  p95 {audio['p95']}  p99 {audio['p99']}")
+    print(f"Chamadas ao LLM por turno: {resumo['llm_chamadas_por_turno']}  |  Turnos sem resposta: {resumo['sem_resposta']}")
+    print(f"{'etapa':<22} {'média ms':>9} {'p95 ms':>8} {'turnos':>7}")
+    for etapa, valores in resumo["etapas_ms"].items():
+        print(f"{etapa:<22} {valores['media']:>9.1f} {valores['p95']:>8.1f} {valores['turnos']:>7}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modo", choices=["direto", "ws", "ambos"], default="ambos")
+    parser.add_argument("--clientes", type=int, default=8, help="Clientes simultâneos")
+    parser.add_argument("--turnos", type=int, default=5, help="Turnos por cliente")
+    parser.add_argument("--linhas", type=int, default=5000, help="Filmes no catálogo sintético")
+    parser.add_argument("--latencia-llm", type=float, default=0.3, help="Segundos fixos por chamada ao LLM")
+    parser.add_argument("--latencia-por-kchar", type=float, default=0.05, help="Segundos por 1000 caracteres de prompt")
+    parser.add_argument("--latencia-por-token", type=float, default=0.01, help="Segundos entre tokens no streaming")
+    parser.add_argument("--latencia-whisper", type=float, default=0.2, help="Segundos por lote do Whisper")
+    parser.add_argument("--latencia-whisper-por-fala", type=float, default=0.02, help="Segundos extras por fala no lote")
+    parser.add_argument("--latencia-tts", type=float, default=0.15, help="Segundos por síntese")
+    parser.add_argument("--sem-cache", action="store_true", help="Desliga os caches de interpretação, ranking e TTS")
+    parser.add_argument("--sem-streaming", action="store_true", help="Servidor responde com o áudio inteiro no final")
+    parser.add_argument("--diretorio", default=None, help="Diretório de trabalho (reaproveita o dataset e o cache entre execuções)")
+    parser.add_argument("--json", default=None, help="Salva o resumo neste arquivo")
+    parser.add_argument("--limite-p95", type=float, default=None, help="Falha se o p95 do turno passar disso (ms)")
+    parser.add_argument("--min-vazao", type=float, default=None, help="Falha se a vazão ficar abaixo disso (turnos/s)")
+    parser.add_argument("--verbose", action="store_true", help="Mostra os logs do servidor")
+    args = parser.parse_args()
+
+    saida_json = os.path.abspath(args.json) if args.json else None
+    diretorio = args.diretorio or tempfile.mkdtemp(prefix="virtkino-e2e-")
+    prepararDiretorio(diretorio, args.linhas)
+    os.chdir(diretorio)
+    sys.path.insert(0, RAIZ)
+    if args.sem_streaming: os.environ["VIRTKINO_STREAMING"] = "0"
+
+    resumos = {}
+    with OllamaFalso(args.latencia_llm, args.latencia_por_kchar, args.latencia_por_token) as ollama_falso:
+        # O cliente padrão do ollama lê OLLAMA_HOST na importação
+        os.environ["OLLAMA_HOST"] = ollama_falso.host
+        instalarWhisperFalso(args.latencia_whisper, args.latencia_whisper_por_fala)
+        instalarTTSFalso(args.latencia_tts)
+        if args.sem_cache: desligarCaches()
+        from source.back.cacheRecomendacao import invalidarCaches
+
+        saida = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with saida:
+            if args.modo in ("direto", "ambos"):
+                resultados, duracao = rodarDireto(args.clientes, args.turnos)
+                resumos["direto"] = resumir(resultados, duracao)
+                invalidarCaches("benchmark") # O modo seguinte começa com os caches frios
+            if args.modo in ("ws", "ambos"):
+                resultados, duracao = rodarWebsocket(args.clientes, args.turnos)
+                resumos["ws"] = resumir(resultados, duracao)
+        resumos["chamadas_ollama"] = dict(ollama_falso.chamadas)
+
+    for modo in ("direto", "ws"):
+        if modo in resumos: imprimir(modo, resumos[modo])
+    print(f"\nChamadas ao Ollama falso: {resumos['chamadas_ollama']}")
+    if saida_json:
+        with open(saida_json, 'w', encoding='utf-8') as f:
+            json.dump({"parametros": vars(args), **resumos}, f, indent=2, ensure_ascii=False)
+    if not args.diretorio:
+        os.chdir(RAIZ)
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    # Gate de regressão: vale o pior dos modos medidos
+    falhas = []
+    for modo in ("direto", "ws"):
+        if modo not in resumos: continue
+        if args.limite_p95 is not None and resumos[modo]["latencia_ms"]["p95"] > args.limite_p95:
+            falhas.append(f"{modo}: p95 {resumos[modo]['latencia_ms']['p95']} ms > {args.limite_p95} ms")
+        if args.min_vazao is not None and resumos[modo]["vazao_turnos_s"] < args.min_vazao:
+            falhas.append(f"{modo}: vazão {resumos[modo]['vazao_turnos_s']} turnos/s < {args.min_vazao}")
+    for falha in falhas:
+        print(f"[ERROR] Regressão: {falha}")
+    sys.exit(1 if falhas else 0)
+
+if __name__ == "__main__":
+    main()
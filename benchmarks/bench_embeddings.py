@@ -0,0 +1,85 @@
+"""
+Benchmark da busca semântica: recall e latência do score literal (índice invertido)
+vs o score combinado com os embeddings.\\
+Cada consulta usa um sinônimo que não aparece literalmente nas tags do TMDB; os filmes relevantes são os que
+têm a tag original em keywords_list.\\
+Constrói os embeddings se ainda não existirem (precisa do Ollama com o modelo de embedding).
+
+Uso (na raiz do projeto):
+    python -m benchmarks.bench_embeddings --k 10
+    python -m benchmarks.bench_embeddings --falso   # Ollama falso: só mede latência, o recall não significa nada;
+                                                    # os embeddings falsos ficam numa pasta temporária
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.ollamaFalso import OllamaFalso
+
+# (palavras-chave da consulta, tag do TMDB que define os filmes relevantes)
+CONSULTAS = [
+    (["undead"], "zombie"),
+    (["spaceship"], "spacecraft"),
+    (["androids"], "robot"),
+    (["courtroom drama"], "lawyer"),
+    (["bloodsucker"], "vampire"),
+    (["heist"], "robbery"),
+    (["time machine"], "time travel"),
+    (["serial murderer"], "serial killer"),
+    (["extraterrestrial"], "alien"),
+    (["martial arts fighting"], "martial arts"),
+]
+
+def avaliar(df, indice, vetorial, k: int) -> dict:
+    resultados = {"literal": ([], []), "semantico": ([], [])}
+    for palavras, tag in CONSULTAS:
+        relevantes = set(np.flatnonzero(df["keywords_list"].apply(lambda tags: tag in tags).to_numpy()))
+        if not relevantes: continue
+        for modo, (recalls, tempos) in resultados.items():
+            inicio = time.perf_counter()
+            semanticos = None
+            if modo == "semantico":
+                semanticos = vetorial.buscar(" ".join(palavras))
+            linhas, _, _ = indice.recomendar(None, palavras, k=k, semanticos=semanticos)
+            tempos.append(time.perf_counter() - inicio)
+            recalls.append(len(relevantes.intersection(linhas.tolist())) / min(k, len(relevantes)))
+    return {modo: (np.mean(recalls), np.array(tempos) * 1000) for modo, (recalls, tempos) in resultados.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default="dataset/tmdb_5000_movies.csv")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--falso", action="store_true", help="Usa o Ollama falso local")
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as pilha:
+        if args.falso:
+            # O cliente padrão do ollama lê OLLAMA_HOST na importação
+            os.environ["OLLAMA_HOST"] = pilha.enter_context(OllamaFalso(0.0)).host
+        from source.back.dbManager import carregarDataframe, obterIndice, _hashArquivo
+        from source.back import embeddings
+        from source.back.embeddings import IndiceVetorial, construirEmbeddings
+        if args.falso:
+            # Os vetores falsos não podem cair em dataset/embeddings, de onde o servidor carrega os reais
+            embeddings.DIRETORIO_EMBEDDINGS = pilha.enter_context(tempfile.TemporaryDirectory(prefix="virtkino-embeddings-"))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            df = carregarDataframe(args.dataset)
+        hash_csv = _hashArquivo(args.dataset)
+        vetorial = IndiceVetorial.carregar(hash_csv, len(df))
+        if vetorial is None:
+            construirEmbeddings(df, hash_csv)
+            vetorial = IndiceVetorial.carregar(hash_csv, len(df))
+
+        resultados = avaliar(df, obterIndice(df), vetorial, args.k)
+        print(f"{'score':<10} {f'recall@{args.k}':>10} {'média ms':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for modo, (recall, tempos) in resultados.items():
+            print(f"{modo:<10} {recall:>10.3f} {tempos.mean():>9.2f} {np.percentile(tempos, 50):>8.2f} {np.percentile(tempos, 95):>8.2f}")
+
+if __name__ == "__main__":
+    main()
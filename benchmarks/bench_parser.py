@@ -0,0 +1,58 @@
+"""
+Benchmark do parser: modo "combinado" (uma chamada) vs "separado" (classificar + extrair)
+vs "especulativo" (classificar e extrair ao mesmo tempo), com e sem o pré-classificador local.\\
+Roda contra um Ollama falso local, sem GPU.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.bench_parser --latencia 0.3 --latencia-por-kchar 0.05 --repeticoes 10
+"""
+import argparse
+import contextlib
+import io
+import os
+import time
+
+import numpy as np
+
+from benchmarks.ollamaFalso import OllamaFalso
+
+FRASES = [
+    "me recomenda um filme de terror com zumbis",
+    "quero assistir uma comédia romântica dos anos 90",
+    "oi, tudo bem?",
+    "qual a capital do Brasil?",
+    "um filme de ficção científica com robôs",
+]
+
+def medir(interpretarTexto, modo: str, repeticoes: int, usar_preclassificador: bool) -> np.ndarray:
+    tempos = []
+    for _ in range(repeticoes):
+        for frase in FRASES:
+            inicio = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                interpretarTexto(frase, modo=modo, usar_preclassificador=usar_preclassificador)
+            tempos.append(time.perf_counter() - inicio)
+    return np.array(tempos) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latencia", type=float, default=0.3, help="Segundos fixos por chamada ao LLM")
+    parser.add_argument("--latencia-por-kchar", type=float, default=0.05, help="Segundos por 1000 caracteres de prompt")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    with OllamaFalso(args.latencia, args.latencia_por_kchar) as ollama_falso:
+        # O cliente padrão do ollama lê OLLAMA_HOST na importação
+        os.environ["OLLAMA_HOST"] = ollama_falso.host
+        from source.back.parserLLM import interpretarTexto
+
+        print(f"{'modo':<33} {'chamadas':>8} {'média ms':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for modo, usar_preclassificador in [(modo, usar) for usar in (False, True) for modo in ("separado", "combinado", "especulativo")]:
+            ollama_falso.chamadas.clear()
+            tempos = medir(interpretarTexto, modo, args.repeticoes, usar_preclassificador)
+            chamadas = ollama_falso.chamadas.get("/api/chat", 0)
+            nome = modo + (" + pré-classificador" if usar_preclassificador else "")
+            print(f"{nome:<33} {chamadas:>8} {tempos.mean():>9.1f} {np.percentile(tempos, 50):>8.1f} {np.percentile(tempos, 95):>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark do Whisper em lote: N sessões terminando de falar ao mesmo tempo,
+transcritas uma a uma (como antes) vs juntas pelo AgendadorTranscricao.\\
+Roda na CPU com int8 e o modelo "tiny" por padrão (baixa o modelo na primeira vez).
+
+Uso (na raiz do projeto):
+    python -m benchmarks.bench_whisper --audio fala.wav --sessoes 1 4 8
+Sem --audio, gera a fala com o Edge-TTS (precisa de internet).
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+from faster_whisper import WhisperModel
+
+from source.back.agendadorTranscricao import AgendadorTranscricao
+
+FRASE_PADRAO = "Me recomenda um filme de ficção científica dos anos noventa com robôs."
+
+def carregarAudio(caminho: str) -> bytes:
+    if caminho:
+        with open(caminho, "rb") as f:
+            return f.read()
+    from source.back.yapper import sintetizarAudio
+    return asyncio.run(sintetizarAudio(FRASE_PADRAO))
+
+def sequencial(model, audio: bytes, sessoes: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(sessoes):
+        segments, _ = model.transcribe(io.BytesIO(audio), language="pt", beam_size=5)
+        " ".join([s.text for s in segments])
+    return time.perf_counter() - inicio
+
+async def emLote(agendador: AgendadorTranscricao, audio: bytes, sessoes: int) -> tuple:
+    inicio = time.perf_counter()
+    textos = await asyncio.gather(*[agendador.transcrever(audio) for _ in range(sessoes)])
+    return time.perf_counter() - inicio, textos[0]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", default=None, help="Arquivo de áudio com uma fala curta")
+    parser.add_argument("--modelo", default="tiny")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--compute-type", default="int8")
+    parser.add_argument("--sessoes", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    audio = carregarAudio(args.audio)
+    model = WhisperModel(args.modelo, device=args.device, compute_type=args.compute_type)
+
+    async def rodar():
+        agendador = AgendadorTranscricao(model, tamanho_lote=max(args.sessoes))
+        await agendador.transcrever(audio) # Aquecimento
+        print(f"{'sessões':>7} {'sequencial s':>13} {'lote s':>8} {'falas/s seq':>12} {'falas/s lote':>13}")
+        for sessoes in args.sessoes:
+            tempo_seq = sequencial(model, audio, sessoes)
+            with contextlib.redirect_stdout(io.StringIO()):
+                tempo_lote, texto = await emLote(agendador, audio, sessoes)
+            print(f"{sessoes:>7} {tempo_seq:>13.2f} {tempo_lote:>8.2f} {sessoes / tempo_seq:>12.2f} {sessoes / tempo_lote:>13.2f}")
+        print(f"[INFO] Transcrição: {texto}")
+
+    asyncio.run(rodar())
+
+if __name__ == "__main__":
+    main()
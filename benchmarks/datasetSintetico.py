@@ -0,0 +1,63 @@
+"""
+Gera um CSV sintético com as mesmas colunas do tmdb_5000_movies.csv, para testes de carga
+com catálogos maiores que o do TMDB (100k+ filmes) sem baixar nada.\\
+Os valores são aleatórios mas com a forma dos reais: JSON de gêneros/palavras-chave, datas, popularidade
+com cauda longa, alguns campos vazios.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.datasetSintetico --linhas 100000 --saida /tmp/tmdb_100k.csv
+"""
+import argparse
+import random
+import json
+import csv
+
+COLUNAS = ["budget", "genres", "homepage", "id", "keywords", "original_language", "original_title", "overview",
+           "popularity", "production_companies", "production_countries", "release_date", "revenue", "runtime",
+           "spoken_languages", "status", "tagline", "title", "vote_average", "vote_count"]
+
+# Gêneros do TMDB (id, nome), os mesmos do configs/genres.json
+GENEROS = [(28, "Action"), (12, "Adventure"), (16, "Animation"), (35, "Comedy"), (80, "Crime"), (99, "Documentary"),
+           (18, "Drama"), (10751, "Family"), (14, "Fantasy"), (36, "History"), (27, "Horror"), (10402, "Music"),
+           (9648, "Mystery"), (10749, "Romance"), (878, "Science Fiction"), (53, "Thriller"), (10752, "War"), (37, "Western")]
+
+PALAVRAS = ("zombie robot beach love war space alien murder detective school family dog cat ghost vampire "
+            "time travel heist king queen dragon ship ocean city night dream future past killer hero villain "
+            "spacecraft lawyer robbery serial killer martial arts").split()
+IDIOMAS = ["en", "en", "en", "fr", "ja", "pt", "es"]
+DURACOES = [80, 95, 110, 130, 160, ""]
+
+def linhaFilme(i: int, aleatorio: random.Random) -> list:
+    generos = aleatorio.sample(GENEROS, aleatorio.randint(1, 3))
+    palavras = aleatorio.sample(PALAVRAS, aleatorio.randint(0, 4))
+    sinopse = " ".join(aleatorio.choices(PALAVRAS + ["the", "a", "of", "and"], k=25)).capitalize() + "."
+    data = "" if aleatorio.random() < 0.01 else f"{aleatorio.randint(1920, 2016)}-{aleatorio.randint(1, 12):02d}-{aleatorio.randint(1, 28):02d}"
+    return [
+        0, json.dumps([{"id": id_genero, "name": nome} for id_genero, nome in generos]), "", i,
+        json.dumps([{"id": j, "name": palavra} for j, palavra in enumerate(palavras)]),
+        aleatorio.choice(IDIOMAS), f"T{i}", sinopse if aleatorio.random() > 0.01 else "",
+        round(aleatorio.expovariate(1 / 20), 3), "[]", "[]", data, 0, aleatorio.choice(DURACOES), "[]", "Released", "",
+        f"Movie {i} {aleatorio.choice(PALAVRAS)}", round(aleatorio.uniform(2, 9), 1), aleatorio.randint(0, 5000)
+    ]
+
+def gerarDataset(caminho: str, linhas: int, semente: int = 1):
+    """
+    Escreve o CSV com 'linhas' filmes. A mesma semente gera sempre o mesmo arquivo (e o mesmo cache do dataset)
+    """
+    aleatorio = random.Random(semente)
+    with open(caminho, 'w', newline='', encoding='utf-8') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(COLUNAS)
+        escritor.writerows(linhaFilme(i, aleatorio) for i in range(linhas))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=100000)
+    parser.add_argument("--saida", default="dataset/tmdb_sintetico.csv")
+    parser.add_argument("--semente", type=int, default=1)
+    args = parser.parse_args()
+    gerarDataset(args.saida, args.linhas, args.semente)
+    print(f"[INFO] {args.linhas} filmes sintéticos salvos em '{args.saida}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import threading
+import hashlib
+import json
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Palavras que fazem o servidor falso tratar o texto como pedido de filme
+PALAVRAS_FILME = ("filme", "recomenda", "terror", "comédia", "ação", "ficção", "assistir")
+
+RESPOSTA_CHAT = "Que ótima escolha! Esse filme é incrível. Tenho certeza de que você vai adorar cada minuto."
+
+def _textoUsuario(mensagens: list) -> str:
+    for mensagem in reversed(mensagens):
+        if mensagem.get("role") == "user": return mensagem.get("content", "")
+    return ""
+
+def _ehFilme(texto: str) -> bool:
+    texto = texto.lower()
+    return any(p in texto for p in PALAVRAS_FILME)
+
+def responder(corpo: dict) -> str:
+    """
+    Escolhe uma resposta plausível para o /api/chat de acordo com o tipo de chamada do virtKino
+    """
+    mensagens = corpo.get("messages", [])
+    sistema = mensagens[0].get("content", "") if mensagens else ""
+    texto = _textoUsuario(mensagens)
+    filtros = {"genero": "Terror", "palavras_chave": ["zombie"], "ano_minimo": 1980, "ano_maximo": 1999}
+
+    if isinstance(corpo.get("format"), dict):
+        # Modo combinado (structured output)
+        if _ehFilme(texto): return json.dumps({"intencao": "filme", "filtros": filtros})
+        return json.dumps({"intencao": "conversa", "filtros": {}})
+    if corpo.get("format") == "json":
+        return json.dumps(filtros)
+    if "classificar a intenção" in sistema:
+        return "filme" if _ehFilme(texto) else "conversa"
+    return RESPOSTA_CHAT
+
+def vetorFalso(texto: str, dimensao: int = 64) -> list:
+    """
+    Embedding determinístico derivado do hash do texto
+    """
+    semente = hashlib.sha256(texto.encode("utf-8")).digest()
+    return [((semente[i % len(semente)] + i) % 255) / 255.0 - 0.5 for i in range(dimensao)]
+
+class OllamaFalso:
+    """
+    Servidor HTTP local que imita as rotas do Ollama usadas pelo virtKino.\\
+    - latencia: segundos fixos por chamada
+    - latencia_por_kchar: segundos extras por 1000 caracteres de prompt (simula o prefill)
+    - latencia_por_token: segundos entre tokens no modo stream
+    """
+    def __init__(self, latencia: float = 0.2, latencia_por_kchar: float = 0.0, latencia_por_token: float = 0.0):
+        self.latencia = latencia
+        self.latencia_por_kchar = latencia_por_kchar
+        self.latencia_por_token = latencia_por_token
+        self.chamadas = {}
+        self._lock = threading.Lock()
+        self._servidor = None
+
+    @property
+    def host(self) -> str:
+        return f"http://127.0.0.1:{self._servidor.server_address[1]}" # type: ignore
+
+    def _contar(self, rota: str):
+        with self._lock:
+            self.chamadas[rota] = self.chamadas.get(rota, 0) + 1
+
+    def _esperar(self, corpo: dict):
+        caracteres = sum(len(m.get("content", "")) for m in corpo.get("messages", [])) + len(corpo.get("prompt", ""))
+        time.sleep(self.latencia + self.latencia_por_kchar * caracteres / 1000)
+
+    def iniciar(self):
+        falso = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, dados: dict):
+                corpo = json.dumps(dados).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def do_POST(self):
+                tamanho = int(self.headers.get("Content-Length", 0))
+                corpo = json.loads(self.rfile.read(tamanho) or b"{}")
+                falso._contar(self.path)
+                falso._esperar(corpo)
+
+                if self.path == "/api/chat":
+                    conteudo = responder(corpo)
+                    if corpo.get("stream"):
+                        return self._stream(corpo, conteudo)
+                    return self._json({
+                        "model": corpo.get("model"), "created_at": "2024-01-01T00:00:00Z",
+                        "message": {"role": "assistant", "content": conteudo},
+                        "done": True, "done_reason": "stop",
+                        "prompt_eval_count": sum(len(m.get("content", "")) for m in corpo.get("messages", [])) // 4,
+                        "eval_count": len(conteudo) // 4
+                    })
+                if self.path == "/api/embed":
+                    entradas = corpo.get("input", [])
+                    if isinstance(entradas, str): entradas = [entradas]
+                    return self._json({"model": corpo.get("model"), "embeddings": [vetorFalso(t) for t in entradas]})
+                if self.path == "/api/generate":
+                    return self._json({"model": corpo.get("model"), "created_at": "2024-01-01T00:00:00Z",
+                                       "response": "", "done": True, "done_reason": "load"})
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def _stream(self, corpo: dict, conteudo: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                pedacos = [p + " " for p in conteudo.split(" ")]
+                for i, pedaco in enumerate(pedacos + [""]):
+                    if i and falso.latencia_por_token: time.sleep(falso.latencia_por_token)
+                    final = i == len(pedacos)
+                    linha = json.dumps({
+                        "model": corpo.get("model"), "created_at": "2024-01-01T00:00:00Z",
+                        "message": {"role": "assistant", "content": pedaco}, "done": final,
+                        **({"done_reason": "stop", "eval_count": len(pedacos)} if final else {})
+                    }).encode("utf-8") + b"\n"
+                    self.wfile.write(f"{len(linha):x}\r\n".encode() + linha + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def parar(self):
+        if self._servidor:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.parar()
@@ -0,0 +1,106 @@
+import types
+import time
+import sys
+import io
+
+import numpy as np
+
+class _Segmento:
+    def __init__(self, texto: str):
+        self.text = texto
+
+class _Resultado:
+    def __init__(self, ids: list):
+        self.sequences_ids = [ids]
+        self.no_speech_prob = 0.0 if ids else 0.9
+
+class _Gerador:
+    """
+    Imita o ctranslate2.models.Whisper: um generate por lote, com custo fixo + custo por fala
+    """
+    is_multilingual = True
+
+    def __init__(self, modelo):
+        self.modelo = modelo
+
+    def generate(self, encoder_output, prompts, **kwargs):
+        time.sleep(self.modelo.latencia + self.modelo.latencia_por_fala * len(prompts))
+        return [_Resultado([int(v) for v in linha if v >= 0]) for linha in encoder_output]
+
+class WhisperFalso:
+    """
+    Modelo Whisper falso para os benchmarks sem GPU.\\
+    O "áudio" é o próprio texto em UTF-8: cada byte vira uma amostra e a transcrição devolve o texto de volta.\\
+    Expõe o que o TranscritorIncremental e o AgendadorTranscricao usam do faster_whisper.WhisperModel
+    """
+    latencia = 0.2 # Segundos por chamada (transcribe ou generate de um lote)
+    latencia_por_fala = 0.02 # Segundos extras por fala dentro do lote
+
+    def __init__(self, *args, **kwargs):
+        self.hf_tokenizer = None
+        self.model = _Gerador(self)
+        self.max_length = 448
+
+    def feature_extractor(self, onda: np.ndarray) -> np.ndarray:
+        return np.concatenate([onda, [0]])[None, :] # O faster_whisper devolve um frame a mais
+
+    def encode(self, features: np.ndarray) -> np.ndarray:
+        return features[:, 0]
+
+    def get_prompt(self, tokenizer, previous_tokens=None, without_timestamps=False) -> list:
+        return []
+
+    def transcribe(self, audio, **kwargs) -> tuple:
+        if not isinstance(audio, np.ndarray): audio = decode_audio(audio)
+        time.sleep(self.latencia)
+        return iter([_Segmento(_texto(audio))]), None
+
+def _texto(onda: np.ndarray) -> str:
+    return bytes(onda[onda >= 0].astype(np.uint8)).decode("utf-8", "ignore")
+
+def decode_audio(arquivo, sampling_rate: int = 16000) -> np.ndarray:
+    dados = arquivo.read() if isinstance(arquivo, io.IOBase) else open(arquivo, "rb").read()
+    return np.frombuffer(dados, dtype=np.uint8).astype(np.float32)
+
+def pad_or_trim(array: np.ndarray, length: int = 3000, axis: int = -1) -> np.ndarray:
+    resultado = -np.ones(array.shape[:-1] + (length,), dtype=array.dtype)
+    resultado[..., :min(length, array.shape[-1])] = array[..., :length]
+    return resultado
+
+class VadOptions:
+    def __init__(self, **kwargs):
+        pass
+
+def get_speech_timestamps(audio: np.ndarray, opcoes=None, sampling_rate: int = 16000) -> list:
+    # Fala até o último byte: o fim da fala vem sempre do cliente ('fim_fala')
+    return [{"start": 0, "end": len(audio)}] if len(audio) else []
+
+class Tokenizer:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def decode(self, ids: list) -> str:
+        return bytes(ids).decode("utf-8", "ignore")
+
+def get_suppressed_tokens(tokenizer, tokens: list) -> list:
+    return tokens
+
+def instalarWhisperFalso(latencia: float = 0.2, latencia_por_fala: float = 0.02):
+    """
+    Registra um pacote faster_whisper falso em sys.modules. Precisa rodar antes de importar o servidor
+    """
+    WhisperFalso.latencia = latencia
+    WhisperFalso.latencia_por_fala = latencia_por_fala
+    modulos = {
+        "faster_whisper": {"WhisperModel": WhisperFalso},
+        "faster_whisper.audio": {"decode_audio": decode_audio, "pad_or_trim": pad_or_trim},
+        "faster_whisper.vad": {"VadOptions": VadOptions, "get_speech_timestamps": get_speech_timestamps},
+        "faster_whisper.tokenizer": {"Tokenizer": Tokenizer},
+        "faster_whisper.transcribe": {"get_suppressed_tokens": get_suppressed_tokens},
+    }
+    for nome, atributos in modulos.items():
+        modulo = types.ModuleType(nome)
+        modulo.__dict__.update(atributos)
+        sys.modules[nome] = modulo
+    for nome in modulos:
+        if "." in nome: setattr(sys.modules["faster_whisper"], nome.split(".")[1], sys.modules[nome])
@@ -1,44 +1,68 @@
 from contextlib import asynccontextmanager
+import asyncio
 import base64
-import uuid
+import json
 import os
 
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from fastapi import FastAPI, WebSocket
+from fastapi.responses import FileResponse, Response
+from fastapi import FastAPI, WebSocket, HTTPException
 
-from source.back.yapper import gerarAudio, transcreverAudio, processarIntencao
+from source.back.yapper import sintetizarAudio, preaquecerAudios, audioEmCache, promptsFixos, processarIntencao, processarIntencaoStream
 from source.back.dbManager import carregarDataframe
+from source.back.classificadorRapido import treinarClassificador
+from source.back.parserLLM import estatisticas_especulacao
+from source.back.clienteLLM import preaquecerLLM
+from source.back.logger import encerrarLogger
+from source.back.executor import executarEtapa, limitarEtapa, encerrarExecutor, ocupacaoEtapas
+from source.back.metricas import iniciarTurno, finalizarTurno, descartarTurno, medirEtapa, linhasGauge, textoPrometheus
+from source.back.cacheRecomendacao import estatisticasCaches
+from source.back.cacheAudio import cache_audio
+from source.back.sessoes import Sessao, sessoes
+from source.back.armazemAudio import armazem_audio
+from source.back.transcricao import TranscritorIncremental
+from source.back.agendadorTranscricao import AgendadorTranscricao
 from faster_whisper import WhisperModel
 
 # Config
 
-MODEL_SIZE = "large-v3" # Ou "base" se for necessário algo mais rápido
+MODEL_SIZE = os.getenv("VIRTKINO_WHISPER_MODELO", "large-v3") # Ou "base" se for necessário algo mais rápido
+WHISPER_DEVICE = os.getenv("VIRTKINO_WHISPER_DEVICE", "cuda") # "cpu" para rodar sem GPU
+WHISPER_COMPUTE_TYPE = os.getenv("VIRTKINO_WHISPER_COMPUTE", "float16") # "int8" na CPU
+STREAMING_RESPOSTA = os.getenv("VIRTKINO_STREAMING", "1") == "1" # Fala frase a frase enquanto o LLM gera
+INTERVALO_PARCIAL = 0.7 # Segundos entre transcrições parciais durante a fala
 model_whisper = None
+agendador_whisper = None
 df_filmes = None
 
 # Setup
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global df_filmes, model_whisper
+    global df_filmes, model_whisper, agendador_whisper
     print("[SYSTEM] Iniciando virtKino")
     print("[SYSTEM] Carregando Dataframe")
     df_filmes = carregarDataframe()
+    print("[SYSTEM] Treinando pré-classificador de intenções")
+    treinarClassificador()
+    print("[SYSTEM] Restaurando sessões")
+    sessoes.carregarSnapshot()
     print(f"[SYSTEM] Carregando Faster-Whisper")
-    model_whisper = WhisperModel(MODEL_SIZE, device="cuda", compute_type="float16")
-    print("[SYSTEM] Conectando com TTS")
-    # Gera um áudio para iniciar a conexão.
-    await gerarAudio("Sistema virtKino inicializado e pronto.")
+    model_whisper = WhisperModel(MODEL_SIZE, device=WHISPER_DEVICE, compute_type=WHISPER_COMPUTE_TYPE)
+    # Falas de sessões diferentes que terminam juntas são transcritas num lote só
+    agendador_whisper = AgendadorTranscricao(model_whisper)
+    print("[SYSTEM] Conectando com TTS e carregando o LLM")
+    # Sintetiza as frases fixas (inclusive a de inicialização), o que também inicia a conexão,
+    # enquanto o Ollama carrega o modelo e processa os prompts fixos
+    await asyncio.gather(preaquecerAudios(), asyncio.to_thread(preaquecerLLM, promptsFixos()))
     
     os.makedirs("static", exist_ok=True)
     yield
     print("[SYSTEM] Desligando")
-    # Limpeza dos audios
-    for f in os.listdir("static"):
-        if f.startswith("fala_") or f.startswith("rec_"):
-            try: os.remove(os.path.join("static", f))
-            except: pass
+    encerrarExecutor()
+    sessoes.salvarSnapshot()
+    encerrarLogger() # Escreve as interações que ainda estão na fila
+    cache_audio.encerrar() # Salva em disco os áudios que ainda estão na fila
 
 app = FastAPI(lifespan=lifespan)
 app.add_middleware(
@@ -53,7 +77,110 @@ app.add_middleware(
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.mount("/assets", StaticFiles(directory="source/front/virtkino-front/dist/assets"), name="assets")
 
+async def sintetizarFala(texto: str) -> bytes:
+    """
+    sintetizarAudio respeitando o limite de sínteses simultâneas.\\
+    Áudios já em cache não ocupam vaga da etapa
+    """
+    with medirEtapa("tts"):
+        audio = audioEmCache(texto)
+        if audio is not None:
+            return audio
+        async with limitarEtapa("tts"):
+            return await sintetizarAudio(texto, consultar_cache=False)
+
+async def enviarComAudio(websocket: WebSocket, mensagem: dict, audio: bytes, binario: bool):
+    """
+    Envia uma mensagem de controle acompanhada do seu áudio.\\
+    - Protocolo binário: o JSON sai com 'audio_binario' e o MP3 vai logo em seguida, num frame binário
+    - Compatibilidade: o MP3 vai para o armazém em memória e o JSON leva a 'audio_url'
+    """
+    if binario:
+        await websocket.send_json({**mensagem, "audio_binario": True, "audio_bytes": len(audio)})
+        await websocket.send_bytes(audio)
+    else:
+        await websocket.send_json({**mensagem, "audio_url": f"/api/audio/{armazem_audio.guardar(audio)}"})
+
+async def transmitirResposta(websocket: WebSocket, texto_usuario: str, sessao: Sessao, binario: bool, aoEnfileirar=None):
+    """
+    Pipeline em streaming: o LLM roda no pool da etapa 'llm' e cada frase pronta já vai para o TTS,
+    sendo enviada ao cliente como 'resposta_parcial' na ordem em que foi gerada.\\
+    Retorna (texto completo, debug) e o número de partes enviadas
+    """
+    loop = asyncio.get_running_loop()
+    eventos = asyncio.Queue()
+
+    def produzir():
+        try:
+            for evento in processarIntencaoStream(texto_usuario, df_filmes, sessao):
+                loop.call_soon_threadsafe(eventos.put_nowait, evento)
+        except Exception as e:
+            loop.call_soon_threadsafe(eventos.put_nowait, ("erro", e))
+
+    # Envia os áudios em ordem, enquanto o LLM continua gerando as próximas frases
+    envios = asyncio.Queue()
+    async def enviar():
+        while (item := await envios.get()) is not None:
+            indice, frase, tarefa_audio = item
+            await enviarComAudio(websocket, {
+                "tipo": "resposta_parcial",
+                "indice": indice,
+                "texto": frase
+            }, await tarefa_audio, binario)
+
+    produtor = asyncio.ensure_future(executarEtapa("llm", produzir, aoEnfileirar=aoEnfileirar))
+    enviador = asyncio.create_task(enviar())
+    partes = 0
+    try:
+        while True:
+            evento, valor = await eventos.get()
+            if evento == "frase":
+                envios.put_nowait((partes, valor, asyncio.create_task(sintetizarFala(valor))))
+                partes += 1
+            elif evento == "fim":
+                break
+            else:
+                raise valor
+    finally:
+        envios.put_nowait(None)
+        await enviador
+        await produtor
+    return valor, partes
+
 # Rotas
+@app.get("/api/metrics")
+async def metricas():
+    """
+    Latência por etapa, contadores do LLM, filas e caches no formato de texto do Prometheus
+    """
+    linhas = [textoPrometheus().rstrip("\n")]
+    ocupacao = ocupacaoEtapas()
+    linhas += linhasGauge("virtkino_etapa_em_uso", "Trabalhos rodando em cada etapa",
+                          [({"etapa": etapa}, dados["em_uso"]) for etapa, dados in ocupacao.items()])
+    linhas += linhasGauge("virtkino_etapa_aguardando", "Trabalhos na fila de cada etapa",
+                          [({"etapa": etapa}, dados["aguardando"]) for etapa, dados in ocupacao.items()])
+    caches = {nome: (dados["hits"], dados["misses"]) for nome, dados in estatisticasCaches().items()}
+    caches["tts"] = (cache_audio.estatisticas["hits_memoria"] + cache_audio.estatisticas["hits_disco"], cache_audio.estatisticas["misses"])
+    linhas += linhasGauge("virtkino_cache_hits", "Acertos de cada cache", [({"cache": nome}, hits) for nome, (hits, _) in caches.items()])
+    linhas += linhasGauge("virtkino_cache_misses", "Faltas de cada cache", [({"cache": nome}, misses) for nome, (_, misses) in caches.items()])
+    linhas += linhasGauge("virtkino_especulacoes", "Extrações especulativas do parser por resultado",
+                          [({"resultado": resultado}, valor) for resultado, valor in estatisticas_especulacao.items()])
+    linhas += linhasGauge("virtkino_sessoes", "Sessões em memória", [({}, len(sessoes))])
+    if agendador_whisper is not None:
+        linhas += linhasGauge("virtkino_whisper_lotes", "Lotes e falas transcritos pelo agendador do Whisper",
+                              [({"tipo": tipo}, valor) for tipo, valor in agendador_whisper.estatisticas.items()])
+    return Response(content="\n".join(linhas) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.get("/api/audio/{id_audio}")
+async def servir_audio(id_audio: str):
+    """
+    Entrega um áudio sintetizado guardado em memória
+    """
+    audio = armazem_audio.obter(id_audio)
+    if audio is None:
+        raise HTTPException(status_code=404, detail="Áudio expirado ou inexistente")
+    return Response(content=audio, media_type="audio/mpeg", headers={"Cache-Control": "no-store"})
+
 @app.get("/{full_path:path}")
 async def serve_react_app(full_path: str):
     """
@@ -77,54 +204,159 @@ async def serve_react_app(full_path: str):
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    print("[WEB] Cliente conectado")
-    
+    # O cliente reenvia o id da sessão ao reconectar, para não perder o contexto da conversa
+    sessao = sessoes.obter(websocket.query_params.get("sessao"))
+    await websocket.send_json({"tipo": "sessao", "id": sessao.id})
+    print(f"[WEB] Cliente conectado (sessão {sessao.id})")
+
+    async def avisarFila(etapa: str, posicao: int):
+        # Backpressure: o cliente fica em 'thinking' sabendo que está na fila
+        await websocket.send_json({"tipo": "estado", "valor": "thinking", "fila": {"etapa": etapa, "posicao": posicao}})
+
+    async def conduzirFala(fala: TranscritorIncremental, fim_fala: asyncio.Event):
+        """
+        Transcreve a fala enquanto ela chega e, assim que o VAD detecta o fim (ou o cliente avisa),
+        fecha a transcrição e já começa o turno
+        """
+        endpoint = False
+        while not fim_fala.is_set() and not endpoint:
+            try:
+                await asyncio.wait_for(fim_fala.wait(), INTERVALO_PARCIAL)
+            except asyncio.TimeoutError:
+                pass
+            if fim_fala.is_set() or not fala.temAudioNovo:
+                continue
+            # Parciais são opcionais: com o Whisper ocupado ou com fila, cedem a vaga aos lotes do agendador
+            # (o áudio fica para a próxima passada). Sem aviso de fila: o cliente ainda está gravando
+            whisper = ocupacaoEtapas()["whisper"]
+            if whisper["aguardando"] > 0 or whisper["em_uso"] >= whisper["limite"]:
+                continue
+            with medirEtapa("transcricao_parcial"):
+                parcial, endpoint = await executarEtapa("whisper", fala.transcreverParcial)
+            if parcial:
+                await websocket.send_json({"tipo": "transcricao", "texto": parcial, "parcial": True})
+
+        fala.encerrado = True
+        if endpoint:
+            # O usuário parou de falar antes de soltar o botão: o cliente pode parar de gravar
+            await websocket.send_json({"tipo": "endpoint"})
+        await websocket.send_json({"tipo": "estado", "valor": "thinking"})
+        # O turno começa quando a fala termina
+        turno = iniciarTurno()
+        with medirEtapa("transcricao"):
+            texto_usuario = fala.textoEstavel()
+            if texto_usuario is None:
+                texto_usuario = await agendador_whisper.transcrever(bytes(fala.buffer)) or (fala.parciais[-1] if fala.parciais else "") # type: ignore
+        await atenderTurno(websocket, sessao, binario, avisarFila, texto_usuario=texto_usuario, turno=turno)
+
+    # Protocolo do cliente: frames binários de áudio ou JSON com base64 (compatibilidade com o front antigo)
+    binario = False
+    # Fala em andamento no modo de transcrição incremental (entre 'inicio_fala' e 'fim_fala')
+    fala, fim_fala, tarefa_fala = None, None, None
     try:
         while True:
-            # Recebe JSON contendo o áudio em base64
-            data = await websocket.receive_json()
-            
-            if "audio_data" in data:
-                # 1. Salva o áudio recebido (webm/wav do navegador)
-                audio_bytes = base64.b64decode(data["audio_data"])
-                nome_arquivo_rec = f"static/rec_{uuid.uuid4()}.webm"
-                
-                with open(nome_arquivo_rec, "wb") as f:
-                    f.write(audio_bytes)
-                
-                # 2. Avisa: Processando
-                await websocket.send_json({"tipo": "estado", "valor": "thinking"})
-                
-                # 3. Transcreve (Whisper Local)
-                texto_usuario = transcreverAudio(nome_arquivo_rec, model_whisper)
-                
-                # Limpa arquivo de entrada
-                os.remove(nome_arquivo_rec)
-
-                if texto_usuario:
-                    # Envia transcrição para o usuário ver
-                    await websocket.send_json({"tipo": "transcricao", "texto": texto_usuario})
-                    
-                    # 4. Lógica (LLM)
-                    resposta, debug_info = processarIntencao(texto_usuario, df_filmes)
-                    
-                    # 3. Gera Áudio
-                    arquivo = await gerarAudio(resposta)
-                    
-                    # 4. Devolve tudo (+ DEBUG INFO)
-                    await websocket.send_json({
-                        "tipo": "resposta",
-                        "texto": resposta,
-                        "audio_url": f"/static/{arquivo}",
-                        "estado": "speaking",
-                        "debug": debug_info # Envia o "Raio-X" pro front
-                    })
-                else:
-                    # Whisper não ouviu nada
-                    await websocket.send_json({"tipo": "estado", "valor": "idle"})
+            mensagem = await websocket.receive()
+            if mensagem["type"] == "websocket.disconnect":
+                print(f"[WEB] Cliente desconectado (sessão {sessao.id})")
+                break
+
+            if mensagem.get("bytes") is not None:
+                if fala is not None:
+                    # Pedaço de uma fala em andamento
+                    fala.adicionar(mensagem["bytes"])
+                    continue
+                # Frame binário: é o próprio áudio (webm/wav do navegador), sem decodificação
+                binario = True
+                turno = iniciarTurno()
+                audio_bytes = mensagem["bytes"]
+            else:
+                data = json.loads(mensagem.get("text") or "{}")
+                if data.get("tipo") == "config":
+                    binario = data.get("protocolo") == "binario"
+                    continue
+                if data.get("tipo") == "inicio_fala":
+                    binario = True
+                    fala, fim_fala = TranscritorIncremental(model_whisper), asyncio.Event()
+                    tarefa_fala = asyncio.create_task(conduzirFala(fala, fim_fala))
+                    continue
+                if data.get("tipo") == "fim_fala":
+                    if tarefa_fala is not None:
+                        fim_fala.set() # type: ignore
+                        await tarefa_fala
+                    fala, fim_fala, tarefa_fala = None, None, None
+                    continue
+                if "audio_data" not in data:
+                    continue
+                # Compatibilidade: áudio em base64 dentro do JSON, resposta com URL
+                binario = False
+                turno = iniciarTurno()
+                with medirEtapa("decodificacao"):
+                    audio_bytes = base64.b64decode(data["audio_data"])
+
+            await atenderTurno(websocket, sessao, binario, avisarFila, audio_bytes=audio_bytes, turno=turno)
 
     except Exception as e:
         print(f"Erro WS: {e}")
+    finally:
+        if tarefa_fala is not None: tarefa_fala.cancel()
+
+async def atenderTurno(websocket: WebSocket, sessao: Sessao, binario: bool, avisarFila, audio_bytes: bytes = None, texto_usuario: str = None, turno: dict = None): # type: ignore
+    """
+    Um turno completo: transcrição, lógica (LLM + recomendador) e resposta falada.\\
+    Com a transcrição incremental, o texto já chega pronto e a etapa do Whisper é pulada.\\
+    O tempo de cada etapa vai no debug da resposta, em 'tempos'
+    """
+    turno = turno or iniciarTurno()
+    try:
+        await _atenderTurno(websocket, sessao, binario, avisarFila, audio_bytes, texto_usuario, turno)
+    finally:
+        descartarTurno()
+
+async def _atenderTurno(websocket: WebSocket, sessao: Sessao, binario: bool, avisarFila, audio_bytes: bytes, texto_usuario: str, turno: dict):
+    if texto_usuario is None:
+        # 2. Avisa: Processando
+        await websocket.send_json({"tipo": "estado", "valor": "thinking"})
+        
+        # 3. Transcreve (Whisper Local), direto da memória e em lote com as outras sessões
+        with medirEtapa("transcricao"):
+            texto_usuario = await agendador_whisper.transcrever(audio_bytes) # type: ignore
+
+    if not texto_usuario:
+        # Whisper não ouviu nada
+        await websocket.send_json({"tipo": "estado", "valor": "idle"})
+        return
+
+    # Envia transcrição para o usuário ver
+    await websocket.send_json({"tipo": "transcricao", "texto": texto_usuario})
+    
+    # O front antigo (JSON com base64) só entende uma 'resposta' com 'audio_url': fica no caminho de resposta única
+    if STREAMING_RESPOSTA and binario:
+        # 4. Lógica (LLM) + Áudio frase a frase
+        (resposta, debug_info), partes = await transmitirResposta(websocket, texto_usuario, sessao, binario, avisarFila)
+        debug_info["tempos"] = finalizarTurno(turno)
+
+        # 5. Fecha o turno (+ DEBUG INFO)
+        await websocket.send_json({
+            "tipo": "resposta",
+            "texto": resposta,
+            "streaming": True,
+            "partes": partes,
+            "estado": "speaking",
+            "debug": debug_info # Envia o "Raio-X" pro front
+        })
+    else:
+        # 4. Lógica (LLM)
+        resposta, debug_info = await executarEtapa("llm", processarIntencao, texto_usuario, df_filmes, sessao, aoEnfileirar=avisarFila)
+        audio = await sintetizarFala(resposta)
+        debug_info["tempos"] = finalizarTurno(turno)
+        
+        # 5. Gera Áudio e devolve tudo (+ DEBUG INFO)
+        await enviarComAudio(websocket, {
+            "tipo": "resposta",
+            "texto": resposta,
+            "estado": "speaking",
+            "debug": debug_info # Envia o "Raio-X" pro front
+        }, audio, binario)
 
 if __name__ == "__main__":
     import uvicorn
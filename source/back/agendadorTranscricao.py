@@ -0,0 +1,117 @@
+import asyncio
+import time
+import io
+import os
+
+import numpy as np
+from faster_whisper.audio import decode_audio, pad_or_trim
+from faster_whisper.tokenizer import Tokenizer
+from faster_whisper.transcribe import get_suppressed_tokens
+
+from source.back.executor import executarEtapa
+from source.back.metricas import medirEtapa, descartarTurno
+
+# Configuração do lote
+TAMANHO_LOTE = int(os.getenv("VIRTKINO_LOTE_WHISPER", "8"))
+ESPERA_MAXIMA = float(os.getenv("VIRTKINO_ESPERA_LOTE_MS", "50")) / 1000 # Quanto o primeiro pedido espera por companhia
+TAXA_AMOSTRAGEM = 16000
+DURACAO_MAXIMA_LOTE = 30.0 # Segundos: uma janela do Whisper. Falas maiores são transcritas sozinhas
+LIMIAR_SEM_FALA = 0.6 # no_speech_prob acima disso vira texto vazio
+
+class AgendadorTranscricao:
+    """
+    Junta as falas pendentes de todas as sessões numa janela curta de tempo
+    e roda o encoder/decoder do Whisper uma vez para o lote inteiro.\\
+    Cada sessão aguarda só o próprio resultado com await transcrever(audio)
+    """
+    def __init__(self, model, tamanho_lote: int = TAMANHO_LOTE, espera_maxima: float = ESPERA_MAXIMA):
+        self.model = model
+        self.tamanho_lote = tamanho_lote
+        self.espera_maxima = espera_maxima
+        self.estatisticas = {"lotes": 0, "falas": 0}
+        self._fila = asyncio.Queue()
+        self._tarefa = None
+        self._tokenizer = Tokenizer(model.hf_tokenizer, model.model.is_multilingual, task="transcribe", language="pt")
+
+    async def transcrever(self, audio) -> str:
+        """
+        Enfileira a fala (bytes ou caminho) e aguarda o texto
+        """
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.create_task(self._laco())
+        futuro = asyncio.get_running_loop().create_future()
+        await self._fila.put((audio, futuro))
+        return await futuro
+
+    async def _laco(self):
+        descartarTurno() # O laço atende todas as sessões, não pertence ao turno de quem o criou
+        while True:
+            itens = [await self._fila.get()]
+            # Espera a janela para outros pedidos entrarem no lote
+            prazo = time.monotonic() + self.espera_maxima
+            while len(itens) < self.tamanho_lote:
+                restante = prazo - time.monotonic()
+                if restante <= 0: break
+                try:
+                    itens.append(await asyncio.wait_for(self._fila.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                with medirEtapa("whisper_lote"):
+                    textos = await executarEtapa("whisper", self.transcreverLote, [audio for audio, _ in itens])
+                for (_, futuro), texto in zip(itens, textos):
+                    if not futuro.done(): futuro.set_result(texto)
+            except Exception as e:
+                print(f"[ERROR] Erro Whisper em lote: {e}")
+                for _, futuro in itens:
+                    if not futuro.done(): futuro.set_result("")
+
+    def _decodificar(self, audio) -> np.ndarray:
+        # Áudio truncado ou corrompido vira uma onda vazia, que é transcrita como ""
+        if isinstance(audio, np.ndarray): return audio
+        if isinstance(audio, (bytes, bytearray)): audio = io.BytesIO(audio)
+        try:
+            return decode_audio(audio, sampling_rate=TAXA_AMOSTRAGEM)
+        except Exception as e:
+            print(f"[WARN] Fala não decodificável, ignorada no lote: {e}")
+            return np.zeros(0, dtype=np.float32)
+
+    def transcreverLote(self, audios: list) -> list:
+        """
+        Transcreve várias falas de uma vez (síncrono, roda no pool do Whisper).\\
+        Falas de até 30s compartilham um único encode/generate; as maiores passam pelo transcribe normal.\\
+        Uma fala que não decodifica volta como texto vazio sem derrubar as outras do lote
+        """
+        ondas = [self._decodificar(audio) for audio in audios]
+
+        textos = [""] * len(ondas)
+        curtas = [i for i, onda in enumerate(ondas) if 0 < len(onda) <= DURACAO_MAXIMA_LOTE * TAXA_AMOSTRAGEM]
+        for i, onda in enumerate(ondas):
+            if i not in curtas and len(onda):
+                try:
+                    segments, _ = self.model.transcribe(onda, language="pt", beam_size=5)
+                    textos[i] = " ".join([s.text for s in segments]).strip()
+                except Exception as e:
+                    print(f"[ERROR] Erro Whisper em fala longa: {e}")
+
+        if curtas:
+            features = np.stack([pad_or_trim(self.model.feature_extractor(ondas[i])[..., :-1]) for i in curtas])
+            encoder_output = self.model.encode(features)
+            prompt = self.model.get_prompt(self._tokenizer, previous_tokens=[], without_timestamps=True)
+            resultados = self.model.model.generate(
+                encoder_output,
+                [list(prompt) for _ in curtas],
+                beam_size=5,
+                max_length=self.model.max_length,
+                suppress_blank=True,
+                suppress_tokens=get_suppressed_tokens(self._tokenizer, [-1]),
+                return_no_speech_prob=True,
+            )
+            for i, resultado in zip(curtas, resultados):
+                if resultado.no_speech_prob <= LIMIAR_SEM_FALA:
+                    textos[i] = self._tokenizer.decode(resultado.sequences_ids[0]).strip()
+
+        self.estatisticas["lotes"] += 1
+        self.estatisticas["falas"] += len(audios)
+        return textos
@@ -0,0 +1,53 @@
+from collections import OrderedDict
+import threading
+import time
+import uuid
+import os
+
+# Limites do armazém de áudios sintetizados
+MAX_BYTES_AUDIO = int(os.getenv("VIRTKINO_MAX_BYTES_AUDIO", str(64 * 1024 * 1024)))
+TTL_AUDIO = float(os.getenv("VIRTKINO_TTL_AUDIO", "300")) # Segundos até o áudio expirar
+
+class ArmazemAudio:
+    """
+    Guarda os áudios sintetizados em memória até o cliente buscá-los.\\
+    Expira por TTL e, acima de MAX_BYTES_AUDIO, descarta os mais antigos
+    """
+    def __init__(self, max_bytes: int = MAX_BYTES_AUDIO, ttl: float = TTL_AUDIO):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.total_bytes = 0
+        self._audios = OrderedDict() # id => (bytes, expira_em), em ordem de inserção
+        self._lock = threading.Lock()
+
+    def guardar(self, audio: bytes) -> str:
+        id_audio = uuid.uuid4().hex
+        with self._lock:
+            self._audios[id_audio] = (audio, time.monotonic() + self.ttl)
+            self.total_bytes += len(audio)
+            self._evictar()
+        return id_audio
+
+    def obter(self, id_audio: str):
+        """
+        Retorna os bytes do áudio, ou None se não existir ou já tiver expirado
+        """
+        with self._lock:
+            self._evictar()
+            item = self._audios.get(id_audio)
+        return item[0] if item else None
+
+    def _evictar(self):
+        agora = time.monotonic()
+        while self._audios:
+            audio, expira_em = next(iter(self._audios.values()))
+            if expira_em > agora and self.total_bytes <= self.max_bytes:
+                break
+            self._audios.popitem(last=False)
+            self.total_bytes -= len(audio)
+
+    def __len__(self):
+        return len(self._audios)
+
+# Instância única usada pelo servidor
+armazem_audio = ArmazemAudio()
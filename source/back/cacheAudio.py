@@ -0,0 +1,154 @@
+from collections import OrderedDict
+import threading
+import queue
+import hashlib
+import json
+import os
+
+# Limites do cache de TTS
+MAX_BYTES_MEMORIA_TTS = int(os.getenv("VIRTKINO_MAX_BYTES_CACHE_TTS", str(32 * 1024 * 1024)))
+MAX_BYTES_DISCO_TTS = int(os.getenv("VIRTKINO_MAX_BYTES_DISCO_TTS", str(256 * 1024 * 1024)))
+DIRETORIO_CACHE_TTS = "cache/tts"
+
+_FIM = object() # Sentinela que encerra o escritor
+
+def chaveAudio(texto: str, voz: str, rate: str, pitch: str) -> str:
+    """
+    Endereço do áudio no cache: o hash de tudo que muda o MP3 gerado
+    """
+    return hashlib.sha256(json.dumps([texto, voz, rate, pitch], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+class CacheAudio:
+    """
+    Cache LRU de áudios sintetizados, endereçado pelo conteúdo (texto, voz, velocidade, tom).\\
+    Fica em memória e em disco; o disco sobrevive a reinícios e é limitado por MAX_BYTES_DISCO_TTS,
+    descartando os arquivos usados há mais tempo.\\
+    guardar() só põe o áudio numa fila: uma thread escritora salva os arquivos e poda o disco fora do event loop,
+    mantendo o total em disco num índice em memória (o diretório só é listado uma vez, quando ela começa)
+    """
+    def __init__(self, diretorio: str = DIRETORIO_CACHE_TTS, max_bytes_memoria: int = MAX_BYTES_MEMORIA_TTS, max_bytes_disco: int = MAX_BYTES_DISCO_TTS):
+        self.diretorio = diretorio
+        self.max_bytes_memoria = max_bytes_memoria
+        self.max_bytes_disco = max_bytes_disco
+        self.total_bytes = 0
+        self.bytes_disco = 0
+        self.estatisticas = {"hits_memoria": 0, "hits_disco": 0, "misses": 0}
+        self._audios = OrderedDict() # chave => bytes, do menos para o mais usado
+        self._disco = OrderedDict() # chave => tamanho do arquivo, do menos para o mais usado
+        self._lock = threading.Lock()
+        self._fila = queue.Queue()
+        self._thread = None
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.diretorio, f"{chave}.mp3")
+
+    def obter(self, chave: str):
+        """
+        Retorna o MP3 da chave, ou None se não estiver em cache
+        """
+        with self._lock:
+            audio = self._audios.get(chave)
+            if audio is not None:
+                self._audios.move_to_end(chave)
+                self.estatisticas["hits_memoria"] += 1
+                return audio
+
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, "rb") as f:
+                audio = f.read()
+            os.utime(caminho) # Marca como usado para o LRU do disco depois de um reinício
+        except OSError:
+            self.estatisticas["misses"] += 1
+            return None
+        with self._lock:
+            if chave in self._disco: self._disco.move_to_end(chave)
+        self.estatisticas["hits_disco"] += 1
+        self._guardarMemoria(chave, audio)
+        return audio
+
+    def guardar(self, chave: str, audio: bytes):
+        if not audio: return
+        self._guardarMemoria(chave, audio)
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._laco, name="virtkino-cache-tts", daemon=True)
+                    self._thread.start()
+        self._fila.put((chave, audio))
+
+    def _guardarMemoria(self, chave: str, audio: bytes):
+        with self._lock:
+            if chave in self._audios:
+                self._audios.move_to_end(chave)
+                return
+            self._audios[chave] = audio
+            self.total_bytes += len(audio)
+            while self.total_bytes > self.max_bytes_memoria and len(self._audios) > 1:
+                _, antigo = self._audios.popitem(last=False)
+                self.total_bytes -= len(antigo)
+
+    def _laco(self):
+        self._indexarDisco()
+        while True:
+            item = self._fila.get()
+            if item is _FIM: return
+            self._escrever(*item)
+
+    def _indexarDisco(self):
+        # Única listagem do diretório: os arquivos existentes entram no índice do mais antigo para o mais novo
+        try:
+            arquivos = sorted((entrada.stat().st_mtime, entrada.name[:-4], entrada.stat().st_size)
+                              for entrada in os.scandir(self.diretorio) if entrada.name.endswith(".mp3"))
+        except OSError:
+            arquivos = []
+        with self._lock:
+            for _, chave, tamanho in reversed(arquivos): # Antes das chaves já escritas por esta execução
+                if chave not in self._disco:
+                    self._disco[chave] = tamanho
+                    self._disco.move_to_end(chave, last=False)
+                    self.bytes_disco += tamanho
+        self._podarDisco()
+
+    def _escrever(self, chave: str, audio: bytes):
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            temporario = f"{self._caminho(chave)}.{threading.get_ident()}.tmp"
+            with open(temporario, "wb") as f:
+                f.write(audio)
+            os.replace(temporario, self._caminho(chave))
+        except OSError as e:
+            print(f"[WARN] Não foi possível salvar o áudio no cache em disco: {e}")
+            return
+        with self._lock:
+            self.bytes_disco += len(audio) - self._disco.pop(chave, 0)
+            self._disco[chave] = len(audio)
+        self._podarDisco()
+
+    def _podarDisco(self):
+        # Só a thread escritora chama: descarta os menos usados até caber no limite, sem listar o diretório
+        descartados = []
+        with self._lock:
+            while self.bytes_disco > self.max_bytes_disco and len(self._disco) > 1:
+                chave, tamanho = self._disco.popitem(last=False)
+                self.bytes_disco -= tamanho
+                descartados.append(chave)
+        for chave in descartados:
+            try:
+                os.remove(self._caminho(chave))
+            except OSError:
+                pass
+
+    def encerrar(self, timeout: float = 5.0):
+        """
+        Salva os áudios que ainda estiverem na fila e para a thread escritora
+        """
+        if self._thread is None or not self._thread.is_alive(): return
+        self._fila.put(_FIM)
+        self._thread.join(timeout)
+
+    def __len__(self):
+        return len(self._audios)
+
+# Instância única usada pelo servidor
+cache_audio = CacheAudio()
@@ -0,0 +1,93 @@
+from collections import OrderedDict
+import threading
+import time
+import os
+
+from source.back.indexador import normalizarTexto, tokenizar
+
+# Limites dos caches de recomendação
+MAX_ITENS_CACHE = int(os.getenv("VIRTKINO_MAX_CACHE_RECOMENDACAO", "2048"))
+TTL_CACHE = float(os.getenv("VIRTKINO_TTL_CACHE_RECOMENDACAO", "3600")) # Segundos
+
+class CacheTTL:
+    """
+    Cache LRU com expiração por TTL e contadores de hit/miss
+    """
+    def __init__(self, nome: str, max_itens: int = MAX_ITENS_CACHE, ttl: float = TTL_CACHE):
+        self.nome = nome
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._itens = OrderedDict() # chave => (valor, expira_em), do menos para o mais usado
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        """
+        Retorna o valor da chave, ou None se não existir ou tiver expirado
+        """
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None or item[1] <= time.monotonic():
+                if item is not None: del self._itens[chave]
+                self.misses += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return item[0]
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + self.ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "itens": len(self._itens),
+            "hits": self.hits,
+            "misses": self.misses,
+            "taxa_hit": round(self.hits / total, 3) if total else 0.0
+        }
+
+    def __len__(self):
+        return len(self._itens)
+
+# Nível 1: transcrição normalizada => (intenção, filtros extraídos)
+cache_interpretacoes = CacheTTL("interpretacoes")
+# Nível 2: filtros canônicos => (linhas, scores) do ranking
+cache_recomendacoes = CacheTTL("recomendacoes")
+
+def chaveTranscricao(texto: str) -> str:
+    """
+    Normaliza a transcrição para o cache: sem acentos, pontuação ou diferença de caixa/espaços
+    """
+    return " ".join(tokenizar(normalizarTexto(texto)))
+
+def canonicalizarPalavras(palavras_chave: list) -> tuple:
+    """
+    Palavras-chave em minúsculo, com espaços colapsados, sem repetição e ordenadas
+    (a ordem não muda o ranking, que usa a união dos postings)
+    """
+    return tuple(sorted({" ".join(str(p).lower().split()) for p in palavras_chave if str(p).strip()}))
+
+def invalidarCaches(motivo: str):
+    """
+    Esvazia os dois níveis, chamado quando o dataset ou o mapa de gêneros mudam
+    """
+    if len(cache_interpretacoes) or len(cache_recomendacoes):
+        print(f"[INFO] Caches de recomendação invalidados ({motivo})")
+    cache_interpretacoes.limpar()
+    cache_recomendacoes.limpar()
+
+def estatisticasCaches() -> dict:
+    return {
+        "interpretacoes": cache_interpretacoes.estatisticas(),
+        "recomendacoes": cache_recomendacoes.estatisticas()
+    }
@@ -0,0 +1,209 @@
+import threading
+import math
+import csv
+import os
+import re
+
+from source.back.indexador import normalizarTexto
+from source.back.dbManager import carregarGeneros
+from source.back.logger import arquivosLog
+
+# Probabilidade mínima para decidir sem chamar o LLM
+LIMIAR_CONFIANCA = float(os.getenv("VIRTKINO_LIMIAR_PRECLASSIFICADOR", "0.9"))
+MIN_EXEMPLOS_POR_CLASSE = 20 # Abaixo disso o modelo de n-gramas não é usado
+
+# Regras: (regex sobre o texto normalizado, log-odds a favor de 'filme', grupo).
+# Regras do mesmo grupo se sobrepõem, então não somam: vale só a mais forte do grupo.
+# Os verbos de pedido ficam no presente/imperativo: "o filme que você recomendou" não é um pedido
+REGRAS = [
+    (re.compile(r"\b(recomend(a|e|ar|as|aria|acao|acoes)|indic(a|ar|as|aria|ue|acao|acoes)|sugest(ao|oes)|sug(ere|erir|ira|eriria))\b"), 3.0, "pedido"),
+    (re.compile(r"\b(quero|queria|vamos|bora) (ver|assistir)\b"), 3.0, "pedido"),
+    (re.compile(r"\b(um|algum|uns|algo de|filme de|filmes de)\b.*\bfilmes?\b|\bfilmes? (de|com|sobre|para|pra)\b"), 2.0, "filme"),
+    (re.compile(r"\bfilmes?\b"), 1.5, "filme"),
+    (re.compile(r"\b(o que voce acha|opiniao|voce gostou|voce (ja )?viu|gosta de|favorit\w*)\b"), -3.0, "opiniao"),
+    (re.compile(r"^(oi|ola|opa|eai|e ai|hey|bom dia|boa tarde|boa noite|tudo bem|obrigad\w*|valeu|tchau|ate mais)\b"), -4.0, "saudacao"),
+    (re.compile(r"\b(seu nome|quem e voce|como voce esta|qual e o seu|qual o seu)\b"), -3.0, "identidade"),
+    (re.compile(r"\b(livros?|series?|musicas?|jogos?|receitas?|restaurantes?|podcasts?)\b"), -2.0, "outro_assunto"), # "livro de história" não é gênero
+]
+PESO_GENERO = 2.0
+
+# Frases que o pré-classificador nunca pode decidir para o lado oposto (pode mandar para o LLM).
+# Checadas depois de cada treino: um modelo de n-gramas que erre alguma é descartado
+CASOS_SANIDADE = [
+    ("Me recomenda um filme de ação", "filme"),
+    ("Quero assistir um filme de terror com zumbis", "filme"),
+    ("Sugere uma comédia romântica dos anos 90", "filme"),
+    ("Oi, tudo bem?", "conversa"),
+    ("Obrigado!", "conversa"),
+    ("Qual é o seu nome?", "conversa"),
+    ("O que você acha deste filme?", "conversa"),
+    ("Qual é o seu filme de terror favorito?", "conversa"),
+    ("Você gosta de filmes de terror?", "conversa"),
+    ("Você já viu algum filme de ação bom?", "conversa"),
+    ("Você gostou de Titanic?", "conversa"),
+    ("Me indica um restaurante bom", "conversa"),
+    ("me recomenda uma receita de bolo", "conversa"),
+    ("Me sugere um nome pro meu cachorro", "conversa"),
+    ("vamos assistir juntos?", "conversa"),
+    ("quero ver o trailer", "conversa"),
+    ("me recomenda um livro de história", "conversa"),
+    ("me fala do filme de terror que você recomendou", "conversa"),
+]
+ORIGEM_PRE_CLASSIFICADOR = "Origem: pre_classificador" # Marca no log as intenções decididas aqui, fora do treino
+
+_lock = threading.Lock()
+_estado = {"mapa_generos": None, "regex_generos": None, "modelo": None, "treinado": False}
+_estatisticas = {"consultas": 0, "decididas": 0, "filme": 0, "conversa": 0}
+
+def _ngramas(texto: str) -> list:
+    tokens = re.findall(r"\w+", texto)
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+def _regexGeneros():
+    """
+    Regex com todo o vocabulário de gêneros, reconstruída se o configs/genres.json mudar
+    """
+    mapa = carregarGeneros()
+    if _estado["mapa_generos"] is not mapa:
+        chaves = sorted(mapa.keys(), key=len, reverse=True)
+        _estado["regex_generos"] = re.compile(r"\b(" + "|".join(re.escape(c) for c in chaves) + r")\b") if chaves else None
+        _estado["mapa_generos"] = mapa
+    return _estado["regex_generos"]
+
+def treinarClassificador(filepath: str = None) -> bool: # type: ignore
+    """
+    Treina um Naive Bayes de uni/bigramas com o histórico de interações (Input Usuario => Intencao).\\
+    Sem filepath, usa o log atual e os rotacionados. Só entram as intenções decididas pelo LLM.\\
+    Se o modelo treinado errar algum dos CASOS_SANIDADE, ele é descartado e ficam só as regras.\\
+    Retorna True se o modelo de n-gramas ficou ativo
+    """
+    contagens = {"filme": {}, "conversa": {}}
+    documentos = {"filme": 0, "conversa": 0}
+    for filepath in ([filepath] if filepath else arquivosLog()):
+        if not os.path.exists(filepath): continue
+        try:
+            with open(filepath, 'r', newline='', encoding='utf-8') as f:
+                for linha in csv.DictReader(f):
+                    classe = (linha.get("Intencao") or "").strip()
+                    if classe not in contagens: continue
+                    # Rótulos dados pelo próprio pré-classificador realimentariam os erros dele
+                    if ORIGEM_PRE_CLASSIFICADOR in (linha.get("Dados Tecnicos") or ""): continue
+                    documentos[classe] += 1
+                    for ngrama in set(_ngramas(normalizarTexto(linha.get("Input Usuario") or ""))):
+                        contagens[classe][ngrama] = contagens[classe].get(ngrama, 0) + 1
+        except Exception as e:
+            print(f"[WARN] Falha ao ler histórico para o pré-classificador: {e}")
+
+    treinado = min(documentos.values()) >= MIN_EXEMPLOS_POR_CLASSE
+    modelo = None
+    if treinado:
+        vocabulario = set(contagens["filme"]) | set(contagens["conversa"])
+        # Log-odds por n-grama, com suavização de Laplace
+        modelo = {
+            "prior": math.log(documentos["filme"] / documentos["conversa"]),
+            "pesos": {
+                ngrama: math.log((contagens["filme"].get(ngrama, 0) + 1) / (documentos["filme"] + 2))
+                        - math.log((contagens["conversa"].get(ngrama, 0) + 1) / (documentos["conversa"] + 2))
+                for ngrama in vocabulario
+            }
+        }
+    with _lock:
+        _estado["modelo"], _estado["treinado"] = modelo, treinado
+    if treinado:
+        erros = verificarSanidade()
+        if erros:
+            print(f"[WARN] Pré-classificador treinado erra {len(erros)} casos de sanidade (ex: '{erros[0][0]}'), usando só regras")
+            with _lock:
+                _estado["modelo"], _estado["treinado"] = None, False
+            treinado = False
+    print(f"[INFO] Pré-classificador: {documentos['filme']} exemplos 'filme', {documentos['conversa']} 'conversa'"
+          f"{'' if treinado else ' (n-gramas desativados, usando só regras)'}")
+    return treinado
+
+def _avaliar(texto_usuario: str) -> tuple:
+    """
+    (P('filme'), pode_ser_filme): combina as regras com o modelo de n-gramas (se treinado).\\
+    pode_ser_filme só é True com um verbo de pedido e uma pista de filme (a palavra filme ou um gênero),
+    e sem nenhuma regra negativa (opinião, saudação ou pergunta sobre a assistente)
+    """
+    texto = normalizarTexto(texto_usuario)
+    por_grupo = {}
+    for regra, peso, grupo in REGRAS:
+        if regra.search(texto) and abs(peso) > abs(por_grupo.get(grupo, 0.0)):
+            por_grupo[grupo] = peso
+    log_odds = sum(por_grupo.values())
+    veto = any(peso < 0 for peso in por_grupo.values())
+
+    regex_generos = _regexGeneros()
+    genero = regex_generos is not None and regex_generos.search(texto) is not None
+    if genero:
+        log_odds += PESO_GENERO
+    pode_ser_filme = not veto and "pedido" in por_grupo and ("filme" in por_grupo or genero)
+
+    modelo = _estado["modelo"]
+    if modelo is not None:
+        pesos = modelo["pesos"]
+        log_odds += modelo["prior"] + sum(pesos[n] for n in _ngramas(texto) if n in pesos)
+
+    log_odds = max(-30.0, min(30.0, log_odds))
+    return 1 / (1 + math.exp(-log_odds)), pode_ser_filme
+
+def probabilidadeFilme(texto_usuario: str) -> float:
+    """
+    P('filme') combinando as regras com o modelo de n-gramas (se treinado)
+    """
+    return _avaliar(texto_usuario)[0]
+
+def _decidir(texto_usuario: str, limiar: float) -> tuple:
+    p_filme, pode_ser_filme = _avaliar(texto_usuario)
+    # Sem pedido + pista de filme, ou com regra negativa, quem decide 'filme' é o LLM:
+    # "me recomenda uma receita" e "qual o seu filme de terror favorito?" não podem virar recomendação aqui
+    if p_filme >= limiar and pode_ser_filme: return "filme", p_filme
+    if 1 - p_filme >= limiar: return "conversa", p_filme
+    return None, p_filme
+
+def verificarSanidade(limiar: float = None) -> list: # type: ignore
+    """
+    Casos de CASOS_SANIDADE decididos para o lado errado, como (frase, esperado, decisão)
+    """
+    limiar = LIMIAR_CONFIANCA if limiar is None else limiar
+    erros = []
+    for frase, esperado in CASOS_SANIDADE:
+        decisao, _ = _decidir(frase, limiar)
+        if decisao is not None and decisao != esperado:
+            erros.append((frase, esperado, decisao))
+    return erros
+
+def preClassificar(texto_usuario: str, limiar: float = None): # type: ignore
+    """
+    Tenta classificar sem o LLM.\\
+    Retorna 'filme' ou 'conversa' se a confiança passar do limiar, ou None se for melhor perguntar ao LLM
+    """
+    limiar = LIMIAR_CONFIANCA if limiar is None else limiar
+    decisao, p_filme = _decidir(texto_usuario, limiar)
+
+    with _lock:
+        _estatisticas["consultas"] += 1
+        if decisao:
+            _estatisticas["decididas"] += 1
+            _estatisticas[decisao] += 1
+    print(f"[INFO] Pré-classificador: P(filme)={p_filme:.3f} => {decisao or 'LLM'}")
+    return decisao
+
+def estatisticasPreClassificador() -> dict:
+    """
+    Quantas classificações o pré-classificador resolveu sozinho (cada uma é uma chamada ao LLM a menos)
+    """
+    with _lock:
+        estatisticas = dict(_estatisticas)
+    estatisticas["taxa_hit"] = estatisticas["decididas"] / estatisticas["consultas"] if estatisticas["consultas"] else 0.0
+    estatisticas["limiar"] = LIMIAR_CONFIANCA
+    estatisticas["ngramas_ativos"] = _estado["treinado"]
+    return estatisticas
+
+if __name__ == "__main__":
+    # Checagem rápida: python -m source.back.classificadorRapido
+    treinarClassificador()
+    for frase, esperado in CASOS_SANIDADE:
+        decisao, p_filme = _decidir(frase, LIMIAR_CONFIANCA)
+        print(f"{'ERRO' if decisao not in (None, esperado) else 'ok':<4} P(filme)={p_filme:.3f} {decisao or 'LLM':<8} (esperado {esperado}) {frase}")
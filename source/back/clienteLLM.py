@@ -0,0 +1,53 @@
+import httpx
+import ollama
+import time
+import os
+
+# Modelo e residência na memória
+MODELO_LLM = os.getenv("VIRTKINO_MODELO_LLM", "llama3:8b")
+KEEP_ALIVE = os.getenv("VIRTKINO_KEEP_ALIVE", "-1") # Quanto o Ollama mantém o modelo carregado após a última chamada ("-1" = sempre, "30m", ...)
+NUM_CTX = os.getenv("VIRTKINO_NUM_CTX") # Contexto fixo para todas as chamadas (vazio = padrão do Ollama)
+CONEXOES_LLM = int(os.getenv("VIRTKINO_CONEXOES_LLM", "8")) # Conexões HTTP mantidas abertas com o Ollama
+
+def _keepAlive(valor: str):
+    # Números vão como segundos (negativo = para sempre); o resto como duração ("30m")
+    try:
+        return float(valor)
+    except ValueError:
+        return valor
+
+# Todas as chamadas usam as mesmas opções: trocar opções de carga (ex: num_ctx) faz o Ollama recarregar o modelo
+OPCOES_LLM = {"num_ctx": int(NUM_CTX)} if NUM_CTX else {}
+
+# Cliente único, com o pool de conexões HTTP compartilhado por todas as threads
+cliente_llm = ollama.Client(limits=httpx.Limits(max_connections=CONEXOES_LLM, max_keepalive_connections=CONEXOES_LLM))
+
+def chat(mensagens: list, opcoes: dict = None, **kwargs): # type: ignore
+    """
+    /api/chat com o modelo do virtKino, mantendo-o carregado.\\
+    As mensagens devem começar pelo prompt de sistema fixo: o Ollama reaproveita o cache de KV do maior
+    prefixo igual ao de uma chamada anterior, então só o que vem depois dele (histórico e fala) passa pelo prefill
+    """
+    return cliente_llm.chat(model=MODELO_LLM, messages=mensagens, keep_alive=_keepAlive(KEEP_ALIVE),
+                            options={**OPCOES_LLM, **(opcoes or {})}, **kwargs)
+
+def embed(textos: list, modelo: str):
+    """
+    /api/embed pelo mesmo cliente, mantendo o modelo de embedding carregado
+    """
+    return cliente_llm.embed(model=modelo, input=textos, keep_alive=_keepAlive(KEEP_ALIVE))
+
+def preaquecerLLM(prompts_sistema: list):
+    """
+    Carrega o modelo antes do primeiro cliente e processa cada prompt de sistema fixo uma vez,
+    deixando esses prefixos no cache de KV do Ollama
+    """
+    inicio = time.perf_counter()
+    try:
+        cliente_llm.generate(model=MODELO_LLM, keep_alive=_keepAlive(KEEP_ALIVE), options=OPCOES_LLM) # Sem prompt: só carrega
+        for prompt in prompts_sistema:
+            chat([{'role': 'system', 'content': prompt}, {'role': 'user', 'content': 'oi'}], opcoes={"num_predict": 1})
+    except Exception as e:
+        print(f"[WARN] Não foi possível pré-aquecer o LLM: {e}")
+        return
+    print(f"[INFO] LLM '{MODELO_LLM}' carregado com {len(prompts_sistema)} prompts fixos em {time.perf_counter() - inicio:.1f}s")
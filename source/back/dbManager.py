@@ -1,11 +1,45 @@
 import pandas as pd
 import numpy as np
+import threading
+import hashlib
+import shutil
 import json
+import time
 import os
 
-def carregarGeneros(filepath = "configs/genres.json"):
+from source.back.indexador import IndiceFilmes, normalizarTexto, vetorPesos, PESOS_PADRAO
+from source.back.cacheRecomendacao import cache_recomendacoes, canonicalizarPalavras, invalidarCaches
+from source.back.embeddings import IndiceVetorial, BUSCA_SEMANTICA, SIMILARIDADE_MINIMA
+from source.back.metricas import medirEtapa
+
+ARQUIVO_GENEROS = "configs/genres.json"
+ARQUIVO_RANKING = "configs/ranking.json" # Pesos de cada critério do score
+INTERVALO_CHECAGEM_GENEROS = 5.0 # Segundos entre checagens do mtime do arquivo de gêneros (e do de pesos)
+
+# Nomes de idiomas que o LLM pode devolver no lugar do código ISO 639-1
+NOMES_IDIOMAS = {
+    "portugues": "pt", "ingles": "en", "espanhol": "es", "frances": "fr", "italiano": "it", "alemao": "de",
+    "japones": "ja", "coreano": "ko", "chines": "zh", "mandarim": "zh", "cantones": "cn", "hindi": "hi",
+    "russo": "ru", "sueco": "sv", "dinamarques": "da", "holandes": "nl", "turco": "tr", "arabe": "ar"
+}
+
+# Cache binário do dataset processado
+DIRETORIO_CACHE = "dataset/cache"
+VERSAO_CACHE = 3 # Incrementar sempre que o processamento do dataset ou do índice mudar
+
+_indice_atual = None # Índice do último dataframe carregado
+_hash_dataset = None # SHA-256 do CSV carregado, para invalidar os caches de recomendação
+_vetorial = {"hash": None, "indice": None} # Embeddings do dataset carregado (None se não foram construídos)
+
+# Vocabulário de gêneros em memória, recarregado apenas quando o mtime do arquivo muda
+_generos = {"filepath": None, "mtime": None, "checado_em": 0.0, "mapa": {}, "ids": None, "indice": None}
+_lock_generos = threading.Lock()
+# Pesos do ranking em memória, com o mesmo esquema de recarga do mapa de gêneros
+_pesos = {"filepath": None, "mtime": None, "checado_em": 0.0, "vetor": vetorPesos()}
+
+def _lerArquivoGeneros(filepath: str) -> dict:
     """
-    Carrega o mapeamento de gêneros de um arquivo JSON externo.\\
+    Lê o mapeamento de gêneros do JSON, com as chaves normalizadas (sem acento, minúsculas).\\
     Se falhar, retorna um dicionário vazio.
     """
     if not os.path.exists(filepath):
@@ -13,12 +47,88 @@ def carregarGeneros(filepath = "configs/genres.json"):
         return {}
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
+            mapa = {normalizarTexto(chave): genero for chave, genero in json.load(f).items()}
             print("[INFO] Mapa de gêneros carregado")
-            return json.load(f)
+            return mapa
     except json.JSONDecodeError as e:
         print(f"[ERROR] Falha ao ler '{filepath}': {e}")
         return {}
 
+def carregarGeneros(filepath = ARQUIVO_GENEROS) -> dict:
+    """
+    Retorna o mapeamento de gêneros (chave normalizada => gênero do dataset) mantido em memória.\\
+    O arquivo só é relido quando seu mtime muda, checado no máximo a cada INTERVALO_CHECAGEM_GENEROS segundos,
+    então dá para editar o mapa sem reiniciar o servidor.
+    """
+    agora = time.monotonic()
+    if _generos["filepath"] == filepath and agora - _generos["checado_em"] < INTERVALO_CHECAGEM_GENEROS:
+        return _generos["mapa"]
+
+    with _lock_generos:
+        mtime = os.path.getmtime(filepath) if os.path.exists(filepath) else None
+        if _generos["filepath"] != filepath or _generos["mtime"] != mtime:
+            if _generos["filepath"] is not None: invalidarCaches("mapa de gêneros alterado")
+            _generos["mapa"] = _lerArquivoGeneros(filepath)
+            _generos["filepath"] = filepath
+            _generos["mtime"] = mtime
+            _generos["ids"] = None # Força recalcular os ids de gênero do scorer
+        _generos["checado_em"] = agora
+    return _generos["mapa"]
+
+def _lerArquivoRanking(filepath: str) -> dict:
+    """
+    Lê os pesos do ranking ({"pesos": {critério: peso}}), ignorando critérios desconhecidos.\\
+    Se o arquivo não existir ou falhar, usa os pesos padrão
+    """
+    if not os.path.exists(filepath): return {}
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            pesos = json.load(f).get("pesos", {})
+        desconhecidos = set(pesos) - set(PESOS_PADRAO)
+        if desconhecidos: print(f"[WARN] Critérios de ranking desconhecidos ignorados: {sorted(desconhecidos)}")
+        print("[INFO] Pesos do ranking carregados")
+        return {criterio: float(peso) for criterio, peso in pesos.items() if criterio in PESOS_PADRAO}
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError) as e:
+        print(f"[ERROR] Falha ao ler '{filepath}': {e}")
+        return {}
+
+def carregarPesosRanking(filepath = ARQUIVO_RANKING):
+    """
+    Vetor de pesos do score (ordem de vetorPesos), relido só quando o mtime do arquivo muda.\\
+    Mudar os pesos invalida os caches de recomendação
+    """
+    agora = time.monotonic()
+    if _pesos["filepath"] == filepath and agora - _pesos["checado_em"] < INTERVALO_CHECAGEM_GENEROS:
+        return _pesos["vetor"]
+
+    with _lock_generos:
+        mtime = os.path.getmtime(filepath) if os.path.exists(filepath) else None
+        if _pesos["filepath"] != filepath or _pesos["mtime"] != mtime:
+            if _pesos["filepath"] is not None: invalidarCaches("pesos do ranking alterados")
+            _pesos["vetor"] = vetorPesos(_lerArquivoRanking(filepath))
+            _pesos["filepath"] = filepath
+            _pesos["mtime"] = mtime
+        _pesos["checado_em"] = agora
+    return _pesos["vetor"]
+
+def resolverGenero(genero: str, indice: IndiceFilmes) -> tuple:
+    """
+    Traduz um gênero em Português direto para a coluna do gênero no scorer.\\
+    Retorna (gênero traduzido, id do gênero ou None)
+    """
+    mapa = carregarGeneros()
+    ids = _generos["ids"]
+    if ids is None or _generos["indice"] is not indice:
+        # Pré-computa chave => id para todo o vocabulário de uma vez
+        ids = {chave: indice.idGenero(alvo) for chave, alvo in mapa.items()}
+        _generos["ids"], _generos["indice"] = ids, indice
+
+    chave = normalizarTexto(genero)
+    if chave in ids:
+        return mapa[chave], ids[chave]
+    # Sem tradução: tenta o gênero como veio (ex: já em inglês)
+    return genero, indice.idGenero(chave)
+
 def parse_json_col(x, key='name'):
     try:
         data = json.loads(x)
@@ -26,17 +136,91 @@ def parse_json_col(x, key='name'):
     except:
         return []
     
-def carregarDataframe(filepath: str = 'dataset/tmdb_5000_movies.csv'):
+def _hashArquivo(filepath: str) -> str:
+    """
+    SHA-256 do arquivo, lido em blocos
+    """
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def _metaCache(hash_csv: str) -> dict:
+    return {"versao": VERSAO_CACHE, "sha256": hash_csv, "pandas": pd.__version__, "numpy": np.__version__}
+
+def _carregarCache(hash_csv: str):
+    """
+    Tenta abrir o cache do dataset com esse hash. Retorna o Dataframe ou None
+    """
+    global _indice_atual
+    diretorio = os.path.join(DIRETORIO_CACHE, hash_csv[:16])
+    try:
+        with open(os.path.join(diretorio, "meta.json"), 'r', encoding='utf-8') as f:
+            if json.load(f) != _metaCache(hash_csv):
+                print("[INFO] Cache do dataset desatualizado, reprocessando")
+                return None
+        df = pd.read_pickle(os.path.join(diretorio, "dataframe.pkl"))
+        _indice_atual = IndiceFilmes.carregar(diretorio, df)
+        return df
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[WARN] Cache do dataset corrompido, reprocessando: {e}")
+        return None
+
+def _salvarCache(hash_csv: str, df: pd.DataFrame, indice: IndiceFilmes):
+    """
+    Grava o Dataframe processado e o índice no cache, substituindo caches de versões anteriores do CSV.\\
+    A escrita é feita numa pasta temporária e renomeada no final, então um boot interrompido não deixa cache pela metade
+    """
+    diretorio = os.path.join(DIRETORIO_CACHE, hash_csv[:16])
+    temporario = f"{diretorio}.tmp"
+    try:
+        shutil.rmtree(temporario, ignore_errors=True)
+        os.makedirs(temporario)
+        df.to_pickle(os.path.join(temporario, "dataframe.pkl"))
+        indice.salvar(temporario)
+        with open(os.path.join(temporario, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(_metaCache(hash_csv), f)
+
+        for antigo in os.listdir(DIRETORIO_CACHE):
+            if antigo != os.path.basename(temporario):
+                shutil.rmtree(os.path.join(DIRETORIO_CACHE, antigo), ignore_errors=True)
+        os.replace(temporario, diretorio)
+        print(f"[INFO] Cache do dataset salvo em '{diretorio}'")
+    except Exception as e:
+        print(f"[WARN] Não foi possível salvar o cache do dataset: {e}")
+        shutil.rmtree(temporario, ignore_errors=True)
+
+def carregarDataframe(filepath: str = 'dataset/tmdb_5000_movies.csv', usar_cache: bool = True):
     """
     Carrega o dataset TMDB 5000 e processa as colunas JSON.\\
+    O resultado processado (e o índice) fica num cache binário identificado pelo hash do CSV,
+    então os próximos boots só abrem o cache.\\
     Retorna o Dataframe preparado
     """
-    # Carregando Dataset
+    global _hash_dataset
+    # Identifica a versão do dataset
     try:
-        df = pd.read_csv(filepath)
+        hash_csv = _hashArquivo(filepath)
     except FileNotFoundError:
         print(f"[ERROR] Dataset TMDB 5000 não encontrado!")
         return pd.DataFrame()
+    if _hash_dataset is not None and _hash_dataset != hash_csv:
+        invalidarCaches("dataset alterado")
+    _hash_dataset = hash_csv
+
+    if usar_cache:
+        df = _carregarCache(hash_csv)
+        if df is not None:
+            print(f"[INFO] Dataset TMDB carregado do cache: {len(df)} filmes.")
+            carregarGeneros() # Vocabulário de gêneros já fica em memória antes da primeira requisição
+            carregarPesosRanking()
+            return df
+
+    # Carregando Dataset
+    df = pd.read_csv(filepath)
 
     # Extração de Ano
     df['release_date'] = pd.to_datetime(df['release_date'], errors='coerce')
@@ -54,47 +238,121 @@ def carregarDataframe(filepath: str = 'dataset/tmdb_5000_movies.csv'):
                  df['overview'].fillna('')
     
     print(f"[INFO] Dataset TMDB carregado: {len(df)} filmes.")
+    indice = obterIndice(df)
+    if usar_cache: _salvarCache(hash_csv, df, indice)
+    carregarGeneros() # Vocabulário de gêneros já fica em memória antes da primeira requisição
+    carregarPesosRanking()
     return df
 
-def filtrarFilmes(df_filmes: pd.DataFrame, filtros: dict, verbose = False) -> pd.DataFrame:
+def obterIndice(df_filmes: pd.DataFrame) -> IndiceFilmes:
+    """
+    Retorna o índice invertido do dataframe, construindo-o se ainda não existir.\\
+    Normalmente já foi construído pelo carregarDataframe, fora do caminho das requisições
     """
-    Recomendador de Filmes score-wise por critérios
+    global _indice_atual
+    if _indice_atual is None or _indice_atual.df is not df_filmes:
+        print("[INFO] Construindo índice invertido")
+        _indice_atual = IndiceFilmes(df_filmes)
+        print(f"[INFO] Índice pronto: {len(_indice_atual.termos)} termos.")
+    return _indice_atual
+
+def _inteiro(valor):
+    """
+    Número vindo do LLM (int, float ou string) como inteiro (ano, minutos), ou None se não for um número
+    """
+    try:
+        return int(float(valor)) if valor is not None and str(valor).strip() else None
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+def _idioma(valor):
+    """
+    Código ISO 639-1 do idioma vindo do LLM ("fr", "FR", "francês"), ou None
+    """
+    if not isinstance(valor, str) or not valor.strip(): return None
+    chave = normalizarTexto(valor)
+    return NOMES_IDIOMAS.get(chave, chave)
+
+def obterIndiceVetorial(df_filmes: pd.DataFrame):
+    """
+    Embeddings do dataset atual para a busca semântica, ou None se estiver desligada ou não construída
+    (construa com: python -m source.back.embeddings)
+    """
+    if not BUSCA_SEMANTICA or _hash_dataset is None: return None
+    if _vetorial["hash"] != _hash_dataset:
+        _vetorial["indice"] = IndiceVetorial.carregar(_hash_dataset, len(df_filmes))
+        _vetorial["hash"] = _hash_dataset
+    return _vetorial["indice"]
+
+def filtrarFilmes(df_filmes: pd.DataFrame, filtros: dict, verbose = False, k: int = 5) -> pd.DataFrame:
+    """
+    Recomendador de Filmes score-wise por critérios.\\
+    O ranking fica em cache pelos filtros canônicos (gênero traduzido, palavras-chave ordenadas, anos, duração, idioma);
+    resultado.attrs["cache"] diz se foi "hit" ou "miss"; a coluna 'match' é False para os filmes que só entraram
+    pelos atributos (nenhum critério da consulta bateu)
     """
     if df_filmes.empty: return df_filmes
     
-    candidatos = df_filmes.copy()
-    candidatos['score'] = 0.0
+    indice = obterIndice(df_filmes)
+    id_genero = None
+    palavras_chave = None
 
     print(f"[Recomendador] Critérios Originais: {filtros}")
 
     # Pontua os candidatos que batem os generos
     if 'genero' in filtros and filtros['genero']:
-        # Transforma em lowercase
-        genero_input = filtros['genero'].lower().strip()
-        # Transforma na tradução se disponível
-        genero_alvo = carregarGeneros().get(genero_input, genero_input)
-        if verbose and genero_input is not genero_alvo: print(f"[INFO] Gênero traduzido: '{genero_input}' => '{genero_alvo}'")
-        # Verifica se o gênero alvo está na lista de gêneros do filme
-        matches = candidatos['genres_list'].apply(lambda lista: 1 if any(g.lower() == genero_alvo.lower() for g in lista) else 0) # type: ignore
-        candidatos['score'] += matches * 500 
+        genero_input = filtros['genero'].strip()
+        # Traduz direto para a coluna do gênero na matriz one-hot do índice
+        genero_alvo, id_genero = resolverGenero(genero_input, indice)
+        if verbose and genero_input != genero_alvo: print(f"[INFO] Gênero traduzido: '{genero_input}' => '{genero_alvo}'")
 
     # Pontua os candidatos que batem as palavras-chaves, generos (de novo), etc.
     if 'palavras_chave' in filtros and filtros['palavras_chave']:
-        regex = '|'.join(filtros['palavras_chave'])
-        # Busca na soup
-        matches = candidatos['soup'].str.contains(regex, case=False, na=False).astype(int)
-        candidatos['score'] += matches * 1000
-
-    # Pontua os candidatos por sua popularidade
-    # Apenas aqueles que já receberam alguma pontuação podem receber este boost
-    mask_relevancia = candidatos['score'] > 0
-    candidatos.loc[mask_relevancia, 'score'] += np.log1p(candidatos.loc[mask_relevancia, 'popularity']) * 2
-    candidatos = candidatos.sort_values(by='score', ascending=False)
+        palavras_chave = canonicalizarPalavras(filtros['palavras_chave'])
+
+    # Filtros rígidos (período, duração, idioma): aplicados no índice antes de qualquer pontuação
+    ano_minimo, ano_maximo = _inteiro(filtros.get('ano_minimo')), _inteiro(filtros.get('ano_maximo'))
+    duracao_minima, duracao_maxima = _inteiro(filtros.get('duracao_minima')), _inteiro(filtros.get('duracao_maxima'))
+    idioma = _idioma(filtros.get('idioma'))
+    pesos = carregarPesosRanking()
+
+    chave = (id_genero, palavras_chave, ano_minimo, ano_maximo, duracao_minima, duracao_maxima, idioma, k)
+    ranking = cache_recomendacoes.obter(chave)
+    status_cache = "hit" if ranking is not None else "miss"
+    if ranking is None:
+        # Busca semântica: vizinhos do texto das palavras-chave, somados ao score literal
+        semanticos = None
+        vetorial = obterIndiceVetorial(df_filmes)
+        if vetorial is not None and palavras_chave:
+            try:
+                with medirEtapa("busca_semantica"):
+                    linhas_sem, sims = vetorial.buscar(" ".join(palavras_chave))
+                manter = sims >= SIMILARIDADE_MINIMA
+                semanticos = (linhas_sem[manter], sims[manter])
+            except Exception as e:
+                print(f"[WARN] Busca semântica indisponível, usando só o score literal: {e}")
+        with medirEtapa("recomendacao"):
+            linhas, scores, casou = indice.recomendar(id_genero, list(palavras_chave or []), k=k, semanticos=semanticos, # type: ignore
+                                                      ano_minimo=ano_minimo, ano_maximo=ano_maximo,
+                                                      duracao_minima=duracao_minima, duracao_maxima=duracao_maxima,
+                                                      idioma=idioma, pesos=pesos)
+        if len(linhas) == 0:
+            # Nenhum filme pontuou: os mais bem avaliados dentro dos filtros rígidos; vazio se nenhum os respeita
+            linhas, scores, casou = indice.recomendarPorAtributos(k, ano_minimo=ano_minimo, ano_maximo=ano_maximo,
+                                                                  duracao_minima=duracao_minima, duracao_maxima=duracao_maxima,
+                                                                  idioma=idioma, pesos=pesos)
+        linhas.flags.writeable = scores.flags.writeable = casou.flags.writeable = False # Compartilhados pelo cache
+        ranking = (linhas, scores, casou)
+        cache_recomendacoes.guardar(chave, ranking)
+    linhas, scores, casou = ranking
+
+    # Apenas as linhas vencedoras viram DataFrame; 'match' diz se o filme bateu algum critério da consulta
+    resultado = df_filmes.iloc[linhas].assign(score=scores, match=casou)
+    resultado.attrs["cache"] = status_cache
     
     # Output
-    if not candidatos.empty:
-        print(f"Top 5 Scores: \n{candidatos[['title', 'score']].head(5)}")
-    return candidatos.head(5)
+    print(f"Top 5 Scores: \n{resultado[['title', 'score']]}")
+    return resultado
 
 if __name__ == "__main__":
     print("[DEBUG] Teste da database")
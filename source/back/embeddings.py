@@ -0,0 +1,124 @@
+import pandas as pd
+import numpy as np
+import argparse
+import hashlib
+import shutil
+import json
+import os
+
+from source.back.clienteLLM import embed
+
+# Busca semântica: embeddings do catálogo gerados offline pelo Ollama
+MODELO_EMBEDDING = os.getenv("VIRTKINO_MODELO_EMBEDDING", "nomic-embed-text")
+BUSCA_SEMANTICA = os.getenv("VIRTKINO_BUSCA_SEMANTICA", "1") == "1"
+DIRETORIO_EMBEDDINGS = "dataset/embeddings"
+TAMANHO_LOTE_EMBEDDING = 64 # Textos por chamada ao /api/embed durante a construção
+BLOCO_SIMILARIDADE = 16384 # Linhas convertidas de float16 para float32 por vez na busca
+CANDIDATOS_SEMANTICOS = 50 # Vizinhos mais próximos que entram como candidatos no score
+SIMILARIDADE_MINIMA = float(os.getenv("VIRTKINO_SIMILARIDADE_MINIMA", "0.5")) # Vizinhos menos parecidos que isso são ignorados
+
+def textoFilme(filme) -> str:
+    """
+    Texto de um filme usado no embedding: título, gêneros, palavras-chave e sinopse
+    """
+    return f"{filme['title']}. {', '.join(filme['genres_list'])}. {', '.join(filme['keywords_list'])}. {filme['overview'] if isinstance(filme['overview'], str) else ''}"
+
+def _normalizar(vetores: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(vetores, axis=-1, keepdims=True)
+    return vetores / np.maximum(normas, 1e-12)
+
+def _embed(textos: list, modelo: str) -> np.ndarray:
+    resposta = embed(textos, modelo)
+    return _normalizar(np.asarray(resposta['embeddings'], dtype=np.float32))
+
+def _diretorio(hash_csv: str, modelo: str) -> str:
+    return os.path.join(DIRETORIO_EMBEDDINGS, f"{hash_csv[:16]}-{hashlib.sha256(modelo.encode()).hexdigest()[:8]}")
+
+class IndiceVetorial:
+    """
+    Matriz de embeddings do catálogo (filmes x dimensão), normalizada e em float16, memory-mapped do disco.\\
+    A busca é força bruta por produto interno (similaridade de cosseno), em blocos convertidos para float32
+    para usar o BLAS; para o tamanho do TMDB isso é mais rápido que manter um índice ANN
+    """
+    def __init__(self, vetores: np.ndarray, modelo: str):
+        self.vetores = vetores
+        self.modelo = modelo
+
+    @classmethod
+    def carregar(cls, hash_csv: str, n_filmes: int, modelo: str = MODELO_EMBEDDING):
+        """
+        Abre os embeddings do dataset com esse hash, ou retorna None se não foram construídos
+        """
+        diretorio = _diretorio(hash_csv, modelo)
+        try:
+            with open(os.path.join(diretorio, "meta.json"), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            vetores = np.load(os.path.join(diretorio, "vetores.npy"), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        if meta.get("sha256") != hash_csv or vetores.shape[0] != n_filmes:
+            print("[WARN] Embeddings desatualizados, rode 'python -m source.back.embeddings' de novo")
+            return None
+        print(f"[INFO] Embeddings carregados: {vetores.shape[0]} filmes x {vetores.shape[1]} dimensões ({modelo})")
+        return cls(vetores, modelo)
+
+    def vetorConsulta(self, texto: str) -> np.ndarray:
+        return _embed([texto], self.modelo)[0]
+
+    def similaridades(self, consulta: np.ndarray) -> np.ndarray:
+        """
+        Cosseno da consulta com todos os filmes
+        """
+        resultado = np.empty(len(self.vetores), dtype=np.float32)
+        for inicio in range(0, len(self.vetores), BLOCO_SIMILARIDADE):
+            bloco = np.asarray(self.vetores[inicio:inicio + BLOCO_SIMILARIDADE], dtype=np.float32)
+            resultado[inicio:inicio + len(bloco)] = bloco @ consulta
+        return resultado
+
+    def buscar(self, texto: str, k: int = CANDIDATOS_SEMANTICOS) -> tuple:
+        """
+        Top-k filmes mais próximos do texto.\\
+        Retorna (linhas, similaridades) ordenados pelas linhas, no formato aceito por IndiceFilmes.recomendar
+        """
+        sims = self.similaridades(self.vetorConsulta(texto))
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k] if k < len(sims) else np.arange(len(sims))
+        top.sort()
+        return top, sims[top]
+
+def construirEmbeddings(df: pd.DataFrame, hash_csv: str, modelo: str = MODELO_EMBEDDING, tamanho_lote: int = TAMANHO_LOTE_EMBEDDING):
+    """
+    Gera os embeddings de todo o catálogo pelo Ollama e salva como float16.\\
+    Escreve numa pasta temporária e renomeia no final, como o cache do dataset
+    """
+    diretorio = _diretorio(hash_csv, modelo)
+    temporario = f"{diretorio}.tmp"
+    shutil.rmtree(temporario, ignore_errors=True)
+    os.makedirs(temporario)
+
+    textos = [textoFilme(filme) for _, filme in df.iterrows()]
+    vetores = None
+    for inicio in range(0, len(textos), tamanho_lote):
+        lote = _embed(textos[inicio:inicio + tamanho_lote], modelo)
+        if vetores is None:
+            vetores = np.lib.format.open_memmap(os.path.join(temporario, "vetores.npy"), mode='w+', dtype=np.float16, shape=(len(textos), lote.shape[1]))
+        vetores[inicio:inicio + len(lote)] = lote
+        print(f"[INFO] Embeddings: {min(inicio + tamanho_lote, len(textos))}/{len(textos)}", end="\r")
+    vetores.flush() # type: ignore
+    print()
+    with open(os.path.join(temporario, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump({"sha256": hash_csv, "modelo": modelo, "dimensao": vetores.shape[1]}, f) # type: ignore
+
+    shutil.rmtree(diretorio, ignore_errors=True)
+    os.replace(temporario, diretorio)
+    print(f"[INFO] Embeddings salvos em '{diretorio}'")
+
+if __name__ == "__main__":
+    # Construção offline: python -m source.back.embeddings
+    from source.back.dbManager import carregarDataframe, _hashArquivo
+    parser = argparse.ArgumentParser(description="Gera os embeddings do catálogo para a busca semântica")
+    parser.add_argument("--dataset", default="dataset/tmdb_5000_movies.csv")
+    parser.add_argument("--modelo", default=MODELO_EMBEDDING)
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE_EMBEDDING)
+    args = parser.parse_args()
+    construirEmbeddings(carregarDataframe(args.dataset), _hashArquivo(args.dataset), args.modelo, args.lote)
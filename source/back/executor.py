@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import contextvars
+import functools
+import asyncio
+import time
+import os
+
+from source.back.metricas import registrarDuracao
+
+# Quantos trabalhos de cada etapa podem rodar ao mesmo tempo
+LIMITES_ETAPAS = {
+    "whisper": int(os.getenv("VIRTKINO_LIMITE_WHISPER", "1")), # Um por GPU
+    "llm": int(os.getenv("VIRTKINO_LIMITE_LLM", "4")), # Chamadas ao Ollama em voo (inclui pandas e logging do turno)
+    "tts": int(os.getenv("VIRTKINO_LIMITE_TTS", "8")), # Sínteses simultâneas no Edge-TTS
+}
+
+# Etapas síncronas rodam neste pool, fora do event loop
+_pool = ThreadPoolExecutor(max_workers=LIMITES_ETAPAS["whisper"] + LIMITES_ETAPAS["llm"], thread_name_prefix="virtkino")
+_semaforos = {}
+_aguardando = {etapa: 0 for etapa in LIMITES_ETAPAS}
+_em_uso = {etapa: 0 for etapa in LIMITES_ETAPAS}
+
+def _semaforo(etapa: str) -> asyncio.Semaphore:
+    if etapa not in _semaforos:
+        _semaforos[etapa] = asyncio.Semaphore(LIMITES_ETAPAS[etapa])
+    return _semaforos[etapa]
+
+@asynccontextmanager
+async def limitarEtapa(etapa: str, aoEnfileirar=None):
+    """
+    Ocupa uma vaga da etapa, esperando na fila se todas estiverem ocupadas.\\
+    aoEnfileirar(etapa, posicao) é aguardado antes de entrar na fila, para avisar o cliente (backpressure)
+    """
+    semaforo = _semaforo(etapa)
+    if semaforo.locked():
+        _aguardando[etapa] += 1
+        inicio = time.perf_counter()
+        try:
+            if aoEnfileirar: await aoEnfileirar(etapa, _aguardando[etapa])
+            await semaforo.acquire()
+        finally:
+            _aguardando[etapa] -= 1
+            registrarDuracao(f"fila_{etapa}", time.perf_counter() - inicio)
+    else:
+        await semaforo.acquire()
+    _em_uso[etapa] += 1
+    try:
+        yield
+    finally:
+        _em_uso[etapa] -= 1
+        semaforo.release()
+
+async def executarEtapa(etapa: str, funcao, *args, aoEnfileirar=None):
+    """
+    Roda uma função síncrona (Whisper, Ollama, pandas) no pool de threads, respeitando o limite da etapa.\\
+    O contexto (contextvars) da corrotina é propagado para a thread
+    """
+    async with limitarEtapa(etapa, aoEnfileirar):
+        loop = asyncio.get_running_loop()
+        contexto = contextvars.copy_context()
+        return await loop.run_in_executor(_pool, functools.partial(contexto.run, funcao, *args))
+
+def ocupacaoEtapas() -> dict:
+    """
+    Vagas em uso e clientes na fila de cada etapa
+    """
+    return {
+        etapa: {
+            "limite": limite,
+            "em_uso": _em_uso[etapa],
+            "aguardando": _aguardando[etapa]
+        }
+        for etapa, limite in LIMITES_ETAPAS.items()
+    }
+
+def encerrarExecutor():
+    _pool.shutdown(wait=False, cancel_futures=True)
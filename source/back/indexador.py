@@ -0,0 +1,337 @@
+import pandas as pd
+import numpy as np
+import unicodedata
+import json
+import os
+import re
+
+# Tokens de busca: sequências alfanuméricas em minúsculo
+REGEX_TOKEN = r"\w+"
+_FIM_PREFIXO = chr(0x10FFFF) # Maior caractere possível, fecha o intervalo de prefixo
+
+# Arrays persistidos no cache binário do dataset
+ARRAYS_INDICE = ('termos', 'offsets', 'postings', 'matriz_generos', 'atributos', 'anos', 'linhas_por_ano', 'anos_ordenados',
+                 'duracoes', 'idiomas')
+
+# Pesos padrão do score (configs/ranking.json sobrescreve)
+PESO_GENERO = 500
+PESO_PALAVRAS = 1000
+PESO_SEMANTICO = 800 # Multiplica a similaridade de cosseno (0 a 1) da busca vetorial
+# Atributos de qualidade (normalizados de 0 a 1): desempatam os filmes que batem os mesmos critérios
+PESO_POPULARIDADE = 15
+PESO_NOTA = 20
+PESO_VOTOS = 5
+PESO_RECENCIA = 5
+
+# Critérios do score, na ordem das colunas da matriz de cada consulta:
+# primeiro os que dependem da consulta, depois as colunas da matriz de atributos pré-calculada
+CRITERIOS_CONSULTA = ('genero', 'palavras_chave', 'semantico')
+ATRIBUTOS = ('popularidade', 'nota', 'votos', 'recencia')
+PESOS_PADRAO = {
+    'genero': PESO_GENERO, 'palavras_chave': PESO_PALAVRAS, 'semantico': PESO_SEMANTICO,
+    'popularidade': PESO_POPULARIDADE, 'nota': PESO_NOTA, 'votos': PESO_VOTOS, 'recencia': PESO_RECENCIA
+}
+PERCENTIL_VOTOS_MINIMOS = 0.7 # Votos mínimos (m) da nota bayesiana: o percentil 70 dos votos do catálogo
+
+def normalizarTexto(texto: str) -> str:
+    """
+    Remove acentos, passa para minúsculo e colapsa espaços ("Ficção  Científica" => "ficcao cientifica")
+    """
+    decomposto = unicodedata.normalize('NFKD', str(texto))
+    sem_acento = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acento.lower().split())
+
+def vetorPesos(pesos: dict = None) -> np.ndarray: # type: ignore
+    """
+    Pesos na ordem das colunas do score (CRITERIOS_CONSULTA + ATRIBUTOS); critérios ausentes usam o padrão
+    """
+    pesos = {**PESOS_PADRAO, **(pesos or {})}
+    return np.array([float(pesos[criterio]) for criterio in CRITERIOS_CONSULTA + ATRIBUTOS])
+
+def notaBayesiana(notas: np.ndarray, votos: np.ndarray, percentil: float = PERCENTIL_VOTOS_MINIMOS) -> np.ndarray:
+    """
+    Média ponderada do IMDb: (v / (v + m)) * R + (m / (v + m)) * C.\\
+    Filmes com poucos votos ficam perto da média geral C em vez de ganharem com um 10 de dois votos
+    """
+    com_votos = votos > 0
+    if not com_votos.any(): return np.zeros(len(notas))
+    media = np.average(notas[com_votos], weights=votos[com_votos])
+    minimo = max(np.quantile(votos[com_votos], percentil), 1.0)
+    return (votos / (votos + minimo)) * notas + (minimo / (votos + minimo)) * media
+
+def _normalizar01(valores: np.ndarray) -> np.ndarray:
+    # Escala para 0..1; valores desconhecidos (NaN) viram 0
+    valores = np.asarray(valores, dtype=np.float64)
+    conhecidos = valores[~np.isnan(valores)]
+    if len(conhecidos) == 0: return np.zeros(len(valores))
+    minimo, maximo = conhecidos.min(), conhecidos.max()
+    escalado = (valores - minimo) / (maximo - minimo) if maximo > minimo else np.ones(len(valores))
+    return np.nan_to_num(escalado, nan=0.0)
+
+def tokenizar(texto: str) -> list:
+    """
+    Quebra um texto livre nos mesmos tokens usados pelo índice invertido
+    """
+    return re.findall(REGEX_TOKEN, str(texto).lower())
+
+def _topK(candidatos: np.ndarray, score: np.ndarray, k: int) -> tuple:
+    """
+    Os k maiores scores em ordem decrescente, com empate decidido pela ordem original do dataset.\\
+    O argpartition só acha o k-ésimo score; todos os candidatos empatados com ele entram na ordenação,
+    senão o corte escolheria entre eles arbitrariamente
+    """
+    if len(candidatos) > k:
+        corte = np.partition(score, len(score) - k)[len(score) - k]
+        dentro = np.flatnonzero(score >= corte)
+        candidatos, score = candidatos[dentro], score[dentro]
+    ordem = np.lexsort((candidatos, -score))[:k]
+    return candidatos[ordem], score[ordem]
+
+class IndiceFilmes:
+    """
+    Índice invertido do dataset, construído uma única vez no carregamento.\\
+    - termos: vocabulário ordenado da coluna soup
+    - offsets/postings: listas de postings no formato CSR (termo i => postings[offsets[i]:offsets[i+1]])
+    - matriz_generos: one-hot (filmes x gêneros), cada coluna é o bitmap de um gênero
+    - ids_generos: gênero (normalizado) => coluna da matriz_generos
+    - atributos: matriz (filmes x ATRIBUTOS) normalizada de 0 a 1: popularidade, nota bayesiana, votos e recência
+    - anos: vetor pré-alocado usado pelo filtro de período
+    - linhas_por_ano / anos_ordenados: filmes com ano conhecido ordenados pelo ano, para fatiar períodos por busca binária
+    - duracoes / idiomas: duração em minutos (NaN se desconhecida) e código do idioma original (ids_idiomas => código)
+    """
+    def __init__(self, df: pd.DataFrame, arrays: dict = None, ids_generos: dict = None, ids_idiomas: dict = None): # type: ignore
+        self.df = df
+        self.n_filmes = len(df)
+        if arrays is not None:
+            # Índice vindo do cache, nada a construir
+            for nome in ARRAYS_INDICE: setattr(self, nome, arrays[nome])
+            self.ids_generos = ids_generos
+            self.ids_idiomas = ids_idiomas
+            return
+        self._construirPostings(df['soup'])
+        self._construirMatrizGeneros(df['genres_list'])
+        self.anos = df['year'].to_numpy(dtype=np.float64)
+        self._construirAtributos(df)
+        # Filmes sem data (NaT => NaN) ficam fora do índice de anos
+        com_ano = np.flatnonzero(~np.isnan(self.anos))
+        self.linhas_por_ano = com_ano[np.argsort(self.anos[com_ano], kind='stable')].astype(np.int32)
+        self.anos_ordenados = self.anos[self.linhas_por_ano]
+
+    def _construirPostings(self, soup: pd.Series):
+        # Uma linha por (filme, token), sem repetições dentro do mesmo filme
+        tokens = soup.fillna('').str.lower().str.findall(REGEX_TOKEN)
+        tokens.index = np.arange(self.n_filmes)
+        explodido = tokens.explode().dropna()
+        pares = pd.DataFrame({'linha': explodido.index, 'termo': explodido.astype(str).to_numpy()}).drop_duplicates()
+
+        codigos, termos = pd.factorize(pares['termo'], sort=True)
+        ordem = np.argsort(codigos, kind='stable')
+        self.termos = np.asarray(termos, dtype=str)
+        self.postings = pares['linha'].to_numpy(dtype=np.int32)[ordem]
+        self.offsets = np.zeros(len(self.termos) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codigos, minlength=len(self.termos)), out=self.offsets[1:])
+
+    def _construirMatrizGeneros(self, generos: pd.Series):
+        explodido = pd.Series(generos.to_numpy(), index=np.arange(self.n_filmes)).explode().dropna()
+        codigos, nomes = pd.factorize(explodido.astype(str).map(normalizarTexto), sort=True)
+        self.ids_generos = {nome: i for i, nome in enumerate(nomes)}
+        # Ordem Fortran: cada coluna (bitmap de um gênero) fica contígua na memória
+        self.matriz_generos = np.zeros((self.n_filmes, len(nomes)), dtype=bool, order='F')
+        self.matriz_generos[explodido.index.to_numpy(dtype=np.int64), codigos] = True
+
+    def _construirAtributos(self, df: pd.DataFrame):
+        def coluna(nome: str) -> np.ndarray:
+            if nome not in df: return np.full(self.n_filmes, np.nan)
+            return pd.to_numeric(df[nome], errors='coerce').to_numpy(dtype=np.float64)
+
+        votos = np.nan_to_num(coluna('vote_count'), nan=0.0)
+        nota = notaBayesiana(np.nan_to_num(coluna('vote_average'), nan=0.0), votos)
+        # Ordem das colunas = ATRIBUTOS
+        self.atributos = np.column_stack([
+            _normalizar01(np.log1p(np.nan_to_num(coluna('popularity'), nan=0.0))),
+            _normalizar01(nota),
+            _normalizar01(np.log1p(votos)),
+            _normalizar01(self.anos)
+        ]).astype(np.float32)
+
+        # Duração 0 no TMDB significa desconhecida
+        duracoes = coluna('runtime')
+        self.duracoes = np.where(duracoes > 0, duracoes, np.nan).astype(np.float32)
+        idiomas = df['original_language'].fillna('').astype(str).str.lower() if 'original_language' in df else pd.Series([''] * self.n_filmes)
+        codigos, nomes = pd.factorize(idiomas, sort=True)
+        self.idiomas = codigos.astype(np.int16)
+        self.ids_idiomas = {nome: i for i, nome in enumerate(nomes) if nome}
+
+    def salvar(self, diretorio: str):
+        """
+        Persiste os arrays do índice como .npy, para serem memory-mapped depois
+        """
+        for nome in ARRAYS_INDICE:
+            np.save(os.path.join(diretorio, f"{nome}.npy"), getattr(self, nome))
+        with open(os.path.join(diretorio, "ids_generos.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.ids_generos, f, ensure_ascii=False)
+        with open(os.path.join(diretorio, "ids_idiomas.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.ids_idiomas, f, ensure_ascii=False)
+
+    @classmethod
+    def carregar(cls, diretorio: str, df: pd.DataFrame):
+        """
+        Abre um índice salvo com salvar(), com os arrays memory-mapped (somente leitura)
+        """
+        arrays = {nome: np.load(os.path.join(diretorio, f"{nome}.npy"), mmap_mode='r') for nome in ARRAYS_INDICE}
+        with open(os.path.join(diretorio, "ids_generos.json"), 'r', encoding='utf-8') as f:
+            ids_generos = json.load(f)
+        with open(os.path.join(diretorio, "ids_idiomas.json"), 'r', encoding='utf-8') as f:
+            ids_idiomas = json.load(f)
+        return cls(df, arrays, ids_generos, ids_idiomas)
+
+    def linhasPrefixo(self, prefixo: str) -> np.ndarray:
+        """
+        Filmes com algum token começando com o prefixo.\\
+        Os termos de mesmo prefixo são contíguos no vocabulário, então é uma única fatia dos postings
+        """
+        inicio = np.searchsorted(self.termos, prefixo, side='left')
+        fim = np.searchsorted(self.termos, prefixo + _FIM_PREFIXO, side='left')
+        if inicio == fim: return np.empty(0, dtype=np.int32)
+        return np.unique(self.postings[self.offsets[inicio]:self.offsets[fim]])
+
+    def linhasPeriodo(self, ano_minimo=None, ano_maximo=None) -> np.ndarray:
+        """
+        Filmes lançados entre ano_minimo e ano_maximo (inclusive), em ordem de linha.\\
+        Duas buscas binárias no índice de anos; filmes sem ano nunca entram
+        """
+        inicio = np.searchsorted(self.anos_ordenados, ano_minimo, side='left') if ano_minimo is not None else 0
+        fim = np.searchsorted(self.anos_ordenados, ano_maximo, side='right') if ano_maximo is not None else len(self.anos_ordenados)
+        return np.sort(self.linhas_por_ano[inicio:fim])
+
+    def linhasPalavrasChave(self, palavras_chave: list, restrito_a: np.ndarray = None) -> np.ndarray: # type: ignore
+        """
+        União dos filmes que batem alguma palavra-chave.\\
+        Palavras compostas ("time travel") cruzam os postings de cada token e depois
+        confirmam a frase apenas nos poucos filmes que sobraram.\\
+        restrito_a: linhas ordenadas (ex: um período) às quais a busca se limita antes da confirmação
+        """
+        resultados = []
+        for palavra in palavras_chave:
+            tokens = tokenizar(palavra)
+            if not tokens: continue
+            linhas = self.linhasPrefixo(tokens[0])
+            if restrito_a is not None:
+                linhas = np.intersect1d(linhas, restrito_a, assume_unique=True)
+            for token in tokens[1:]:
+                linhas = np.intersect1d(linhas, self.linhasPrefixo(token), assume_unique=True)
+            if len(tokens) > 1 and len(linhas):
+                soup = self.df['soup'].iloc[linhas].fillna('').str.lower()
+                linhas = linhas[soup.str.contains(palavra.lower(), regex=False).to_numpy()]
+            resultados.append(linhas)
+        if not resultados: return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(resultados))
+
+    def idGenero(self, genero: str):
+        """
+        Coluna do gênero na matriz_generos, ou None se o gênero não existir no dataset
+        """
+        return self.ids_generos.get(normalizarTexto(genero))
+
+    def idIdioma(self, idioma: str):
+        """
+        Código interno do idioma (ISO 639-1, ex: "fr"), ou -1 se nenhum filme do dataset estiver nele
+        """
+        return self.ids_idiomas.get(str(idioma).strip().lower(), -1)
+
+    def linhasRestricao(self, ano_minimo=None, ano_maximo=None, duracao_minima=None, duracao_maxima=None, idioma=None):
+        """
+        Filmes que passam por todos os filtros rígidos (período, duração, idioma), em ordem de linha,
+        ou None se nenhum foi pedido.\\
+        O período é fatiado no índice de anos e as outras condições são máscaras aplicadas só ao que sobrou.
+        Filmes sem a informação (ano, duração) ficam de fora quando o filtro correspondente é pedido
+        """
+        linhas = None
+        if ano_minimo is not None or ano_maximo is not None:
+            if ano_minimo is not None and ano_maximo is not None and ano_minimo > ano_maximo:
+                ano_minimo, ano_maximo = ano_maximo, ano_minimo
+            linhas = self.linhasPeriodo(ano_minimo, ano_maximo).astype(np.int64)
+        if duracao_minima is None and duracao_maxima is None and idioma is None:
+            return linhas
+        if linhas is None:
+            linhas = np.arange(self.n_filmes, dtype=np.int64)
+
+        if duracao_minima is not None or duracao_maxima is not None:
+            if duracao_minima is not None and duracao_maxima is not None and duracao_minima > duracao_maxima:
+                duracao_minima, duracao_maxima = duracao_maxima, duracao_minima
+            duracoes = self.duracoes[linhas]
+            dentro = ~np.isnan(duracoes)
+            if duracao_minima is not None: dentro &= duracoes >= duracao_minima
+            if duracao_maxima is not None: dentro &= duracoes <= duracao_maxima
+            linhas = linhas[dentro]
+        if idioma is not None:
+            linhas = linhas[self.idiomas[linhas] == self.idIdioma(idioma)]
+        return linhas
+
+    def recomendar(self, id_genero=None, palavras_chave=None, k: int = 5, semanticos: tuple = None, ano_minimo=None, ano_maximo=None, # type: ignore
+                   duracao_minima=None, duracao_maxima=None, idioma=None, pesos: np.ndarray = None): # type: ignore
+        """
+        Motor de score vetorizado.\\
+        Pontua apenas a união do bitmap do gênero com os postings das palavras-chave (e os vizinhos da busca
+        semântica, se houver) e seleciona o top-k por partição, sem ordenar o restante.\\
+        O score é um único produto matriz-vetor: uma linha por candidato com os critérios da consulta
+        (gênero, palavras-chave, similaridade) seguidos dos atributos pré-calculados, vezes os pesos.\\
+        semanticos: (linhas ordenadas, similaridades) vindos do IndiceVetorial.buscar\\
+        ano_minimo/ano_maximo, duracao_minima/duracao_maxima (minutos), idioma (ISO 639-1): filtros rígidos,
+        aplicados primeiro; todo o resto só olha os filmes que passaram.
+        Sem gênero nem palavras-chave, todos eles viram candidatos (ranqueados pelos atributos)\\
+        pesos: vetor de vetorPesos() (padrão: PESOS_PADRAO)\\
+        Retorna (linhas, scores, casou) em ordem decrescente de score; casou diz se o filme bateu algum critério
+        da consulta (gênero, palavras-chave ou semântico) ou se só entrou pelos atributos
+        """
+        pesos = vetorPesos() if pesos is None else pesos
+        restricao = self.linhasRestricao(ano_minimo, ano_maximo, duracao_minima, duracao_maxima, idioma)
+
+        bitmap = self.matriz_generos[:, id_genero] if id_genero is not None else None
+        if bitmap is None:
+            linhas_genero = np.empty(0, dtype=np.int64)
+        else:
+            linhas_genero = np.flatnonzero(bitmap) if restricao is None else restricao[bitmap[restricao]]
+        linhas_palavras = self.linhasPalavrasChave(palavras_chave, restricao) if palavras_chave else np.empty(0, dtype=np.int32) # type: ignore
+        linhas_semanticas = semanticos[0] if semanticos is not None else np.empty(0, dtype=np.int64)
+        if restricao is not None and len(linhas_semanticas):
+            dentro = np.isin(linhas_semanticas, restricao, assume_unique=True)
+            linhas_semanticas, semanticos = linhas_semanticas[dentro], (linhas_semanticas[dentro], semanticos[1][dentro])
+
+        candidatos = np.union1d(np.union1d(linhas_genero, linhas_palavras), linhas_semanticas).astype(np.int64)
+        if restricao is not None and bitmap is None and not palavras_chave:
+            candidatos = restricao
+        if len(candidatos) == 0:
+            return candidatos, np.zeros(0), np.zeros(0, dtype=bool)
+
+        # Colunas: CRITERIOS_CONSULTA + ATRIBUTOS, na mesma ordem do vetor de pesos
+        matriz = np.zeros((len(candidatos), len(CRITERIOS_CONSULTA) + len(ATRIBUTOS)))
+        if bitmap is not None: matriz[:, 0] = bitmap[candidatos]
+        if len(linhas_palavras): matriz[:, 1] = np.isin(candidatos, linhas_palavras, assume_unique=True)
+        if len(linhas_semanticas):
+            # Posição de cada candidato na lista (ordenada) de vizinhos semânticos
+            posicoes = np.minimum(np.searchsorted(linhas_semanticas, candidatos), len(linhas_semanticas) - 1)
+            vizinho = linhas_semanticas[posicoes] == candidatos
+            matriz[:, 2] = np.where(vizinho, np.clip(semanticos[1][posicoes], 0, 1), 0)
+        matriz[:, len(CRITERIOS_CONSULTA):] = self.atributos[candidatos]
+        score = matriz @ pesos
+        casou = matriz[:, :len(CRITERIOS_CONSULTA)].any(axis=1)
+
+        linhas, score = _topK(candidatos, score, k)
+        return linhas, score, casou[np.searchsorted(candidatos, linhas)] # candidatos está ordenado
+
+    def recomendarPorAtributos(self, k: int = 5, ano_minimo=None, ano_maximo=None, duracao_minima=None, duracao_maxima=None, idioma=None,
+                               pesos: np.ndarray = None): # type: ignore
+        """
+        Plano B quando nenhum filme pontuou na consulta: os filmes que passam pelos filtros rígidos
+        (ou o catálogo inteiro, sem filtros) ranqueados só pelos atributos.\\
+        Retorna (linhas, scores, casou) como recomendar, com casou sempre False; vazios se nenhum filme respeita os filtros
+        """
+        pesos = vetorPesos() if pesos is None else pesos
+        restricao = self.linhasRestricao(ano_minimo, ano_maximo, duracao_minima, duracao_maxima, idioma)
+        candidatos = np.arange(len(self.atributos), dtype=np.int64) if restricao is None else restricao
+        if len(candidatos) == 0:
+            return candidatos, np.zeros(0), np.zeros(0, dtype=bool)
+        score = self.atributos[candidatos] @ pesos[len(CRITERIOS_CONSULTA):]
+        linhas, score = _topK(candidatos, score.astype(np.float64), k)
+        return linhas, score, np.zeros(len(linhas), dtype=bool)
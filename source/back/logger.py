@@ -1,16 +1,29 @@
+import threading
+import queue
+import glob
+import json
+import time
 import csv
 import os
-from datetime import datetime
+from datetime import datetime, date
 
 # Configuração
 LOG_DIR = "logs"
 LOG_FILE = os.path.join(LOG_DIR, "historico_interacoes.csv")
+LOG_JSONL = os.path.join(LOG_DIR, "historico_interacoes.jsonl") # Formato compacto para análise
+FORMATO_LOG = os.getenv("VIRTKINO_FORMATO_LOG", "csv") # "csv", "jsonl" ou "ambos"
+TAMANHO_LOTE_LOG = 64 # Linhas acumuladas antes de escrever
+INTERVALO_FLUSH_LOG = 1.0 # Segundos máximos que uma linha espera na fila
+MAX_BYTES_LOG = int(os.getenv("VIRTKINO_MAX_BYTES_LOG", str(10 * 1024 * 1024))) # Tamanho para rotacionar o arquivo
 
-def _garantir_estrutura_log():
+CABECALHO_LOG = ["Timestamp", "Input Usuario", "Intencao", "Dados Tecnicos", "Output Sistema"]
+_FIM = object() # Sentinela que encerra o escritor
+
+def _garantir_estrutura_log(caminho: str = LOG_FILE):
     """
     Função interna de segurança.
     Verifica se a pasta e o arquivo existem.
-    Se não existirem, cria a estrutura e o cabeçalho CSV.
+    Se não existirem, cria a estrutura (e o cabeçalho, no CSV).
     Se existirem, não faz nada (preserva os dados).
     """
     try:
@@ -19,40 +32,119 @@ def _garantir_estrutura_log():
             os.makedirs(LOG_DIR, exist_ok=True)
             print(f"[LOGGER] Pasta '{LOG_DIR}' criada.")
 
-        # Garante que o arquivo .csv existe
-        if not os.path.exists(LOG_FILE):
-            print(f"[LOGGER] Arquivo de log não encontrado. Criando novo em: {LOG_FILE}")
-            with open(LOG_FILE, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                # Escreve o cabeçalho
-                writer.writerow([
-                    "Timestamp", 
-                    "Input Usuario", 
-                    "Intencao", 
-                    "Dados Tecnicos", 
-                    "Output Sistema"
-                ])
+        # Garante que o arquivo existe
+        if not os.path.exists(caminho):
+            print(f"[LOGGER] Arquivo de log não encontrado. Criando novo em: {caminho}")
+            with open(caminho, 'w', newline='', encoding='utf-8') as f:
+                if caminho.endswith(".csv"):
+                    # Escreve o cabeçalho
+                    csv.writer(f).writerow(CABECALHO_LOG)
     except Exception as e:
         print(f"[ERROR] Falha crítica ao garantir estrutura de logs: {e}")
 
+def _rotacionarSeNecessario(caminho: str):
+    """
+    Renomeia o arquivo para <nome>.<data-hora>.<ext> se ele passou de MAX_BYTES_LOG
+    ou se é de um dia anterior
+    """
+    try:
+        info = os.stat(caminho)
+    except FileNotFoundError:
+        return
+    if info.st_size < MAX_BYTES_LOG and date.fromtimestamp(info.st_mtime) == date.today():
+        return
+    base, extensao = os.path.splitext(caminho)
+    destino = f"{base}.{datetime.fromtimestamp(info.st_mtime).strftime('%Y%m%d-%H%M%S-%f')}{extensao}"
+    os.replace(caminho, destino)
+    print(f"[LOGGER] Log rotacionado para '{destino}'")
+
+def arquivosLog(caminho: str = LOG_FILE) -> list:
+    """
+    Arquivos de log do mais antigo para o mais novo: os rotacionados e, por último, o atual
+    """
+    base, extensao = os.path.splitext(caminho)
+    arquivos = sorted(glob.glob(f"{glob.escape(base)}.*{extensao}"))
+    return arquivos + ([caminho] if os.path.exists(caminho) else [])
+
+class LoggerInteracoes:
+    """
+    Registro das interações fora do caminho da requisição.\\
+    registrar() só põe a linha numa fila; uma única thread escritora junta as linhas em lotes
+    e escreve quando o lote enche ou a cada INTERVALO_FLUSH_LOG segundos, então as linhas nunca se intercalam
+    """
+    def __init__(self, formato: str = FORMATO_LOG, tamanho_lote: int = TAMANHO_LOTE_LOG, intervalo_flush: float = INTERVALO_FLUSH_LOG):
+        self.formato = formato
+        self.tamanho_lote = tamanho_lote
+        self.intervalo_flush = intervalo_flush
+        self._fila = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def registrar(self, linha: list):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._laco, name="virtkino-logger", daemon=True)
+                    self._thread.start()
+        self._fila.put(linha)
+
+    def _laco(self):
+        lote = []
+        prazo = None
+        while True:
+            try:
+                timeout = None if prazo is None else max(prazo - time.monotonic(), 0)
+                item = self._fila.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is not None and item is not _FIM:
+                lote.append(item)
+                if prazo is None: prazo = time.monotonic() + self.intervalo_flush
+            if lote and (item is None or item is _FIM or len(lote) >= self.tamanho_lote or time.monotonic() >= prazo): # type: ignore
+                self._escrever(lote)
+                lote, prazo = [], None
+            if item is _FIM:
+                return
+
+    def _escrever(self, lote: list):
+        try:
+            if self.formato in ("csv", "ambos"):
+                _rotacionarSeNecessario(LOG_FILE)
+                _garantir_estrutura_log(LOG_FILE)
+                with open(LOG_FILE, 'a', newline='', encoding='utf-8') as f:
+                    csv.writer(f).writerows(lote)
+            if self.formato in ("jsonl", "ambos"):
+                _rotacionarSeNecessario(LOG_JSONL)
+                _garantir_estrutura_log(LOG_JSONL)
+                with open(LOG_JSONL, 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(dict(zip(CABECALHO_LOG, linha)), ensure_ascii=False) + "\n" for linha in lote)
+        except Exception as e:
+            print(f"[ERROR] Não foi possível salvar no log: {e}")
+
+    def encerrar(self, timeout: float = 5.0):
+        """
+        Escreve o que ainda estiver na fila e para a thread escritora
+        """
+        if self._thread is None or not self._thread.is_alive(): return
+        self._fila.put(_FIM)
+        self._thread.join(timeout)
+
+# Instância única usada pelo servidor
+logger_interacoes = LoggerInteracoes()
+
 def registrarInteracao(texto_usuario, intencao, dados_tecnicos, resposta_sistema):
     """
-    Salva a interação no CSV.
-    É seguro chamar a qualquer momento, pois verifica a estrutura antes.
+    Salva a interação no log.
+    Só enfileira a linha (com o horário da chamada); a escrita acontece em segundo plano
     """
-    # Garante que o arquivo exista
-    _garantir_estrutura_log()
+    logger_interacoes.registrar([
+        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        texto_usuario,
+        intencao,
+        str(dados_tecnicos),
+        resposta_sistema
+    ])
 
-    try:
-        with open(LOG_FILE, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                texto_usuario,
-                intencao,
-                str(dados_tecnicos),
-                resposta_sistema
-            ])
-            
-    except Exception as e:
-        print(f"[ERROR] Não foi possível salvar no log: {e}")
\ No newline at end of file
+def encerrarLogger():
+    logger_interacoes.encerrar()
@@ -0,0 +1,150 @@
+from contextlib import contextmanager
+from collections import deque
+import contextvars
+import threading
+import time
+
+# Limites dos histogramas (segundos), no formato do Prometheus
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+AMOSTRAS_PERCENTIS = 1024 # Últimas durações guardadas por etapa para calcular p50/p95/p99
+PERCENTIS = (0.5, 0.95, 0.99)
+
+# Turno em andamento: propagado para as threads do executor junto com o contexto da corrotina
+_turno_atual = contextvars.ContextVar("turno_atual", default=None)
+_lock = threading.Lock()
+
+class Histograma:
+    """
+    Durações de uma etapa: contagens por bucket (cumulativas na exportação), soma e as últimas amostras
+    """
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_SEGUNDOS) + 1) # O último é o +Inf
+        self.soma = 0.0
+        self.contagem = 0
+        self.amostras = deque(maxlen=AMOSTRAS_PERCENTIS)
+
+    def observar(self, segundos: float):
+        indice = next((i for i, limite in enumerate(BUCKETS_SEGUNDOS) if segundos <= limite), len(BUCKETS_SEGUNDOS))
+        self.buckets[indice] += 1
+        self.soma += segundos
+        self.contagem += 1
+        self.amostras.append(segundos)
+
+    def percentis(self) -> dict:
+        if not self.amostras: return {}
+        ordenadas = sorted(self.amostras)
+        return {p: ordenadas[min(int(p * len(ordenadas)), len(ordenadas) - 1)] for p in PERCENTIS}
+
+_histogramas = {} # etapa => Histograma
+_contadores = {"llm_chamadas": 0, "llm_tentativas_extras": 0, "llm_tokens_prompt": 0, "llm_tokens_resposta": 0, "turnos": 0}
+
+def iniciarTurno() -> dict:
+    """
+    Começa o rastreamento de um turno no contexto atual.\\
+    Tudo que rodar a partir daqui (inclusive nas threads do executor) soma as durações neste turno
+    """
+    turno = {
+        "inicio": time.perf_counter(),
+        "etapas": {}, # etapa => segundos somados no turno
+        "llm": {"chamadas": 0, "tentativas_extras": 0, "tokens_prompt": 0, "tokens_resposta": 0}
+    }
+    _turno_atual.set(turno)
+    return turno
+
+def registrarDuracao(etapa: str, segundos: float):
+    """
+    Soma a duração no histograma global da etapa e no turno atual (se houver)
+    """
+    turno = _turno_atual.get()
+    with _lock:
+        if etapa not in _histogramas: _histogramas[etapa] = Histograma()
+        _histogramas[etapa].observar(segundos)
+        if turno is not None:
+            turno["etapas"][etapa] = turno["etapas"].get(etapa, 0.0) + segundos
+
+@contextmanager
+def medirEtapa(etapa: str):
+    """
+    Mede o bloco como uma etapa do turno. Funciona tanto em código síncrono quanto em volta de um await
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrarDuracao(etapa, time.perf_counter() - inicio)
+
+def registrarChamadaLLM(resposta, tentativa: int = 1):
+    """
+    Conta uma chamada ao Ollama e os tokens informados na resposta (prompt_eval_count / eval_count).\\
+    tentativa > 1 conta como retry
+    """
+    tokens_prompt = (resposta.get('prompt_eval_count') if resposta is not None else None) or 0
+    tokens_resposta = (resposta.get('eval_count') if resposta is not None else None) or 0
+    extras = 1 if tentativa > 1 else 0
+    turno = _turno_atual.get()
+    with _lock:
+        _contadores["llm_chamadas"] += 1
+        _contadores["llm_tentativas_extras"] += extras
+        _contadores["llm_tokens_prompt"] += tokens_prompt
+        _contadores["llm_tokens_resposta"] += tokens_resposta
+        if turno is not None:
+            turno["llm"]["chamadas"] += 1
+            turno["llm"]["tentativas_extras"] += extras
+            turno["llm"]["tokens_prompt"] += tokens_prompt
+            turno["llm"]["tokens_resposta"] += tokens_resposta
+
+def finalizarTurno(turno: dict) -> dict:
+    """
+    Fecha o turno (registra a duração total) e retorna o resumo em ms, para o payload de debug
+    """
+    total = time.perf_counter() - turno["inicio"]
+    descartarTurno() # Tarefas criadas depois daqui não herdam o turno encerrado
+    registrarDuracao("turno", total)
+    with _lock:
+        _contadores["turnos"] += 1
+        return {
+            "total_ms": round(total * 1000, 1),
+            "etapas_ms": {etapa: round(segundos * 1000, 1) for etapa, segundos in turno["etapas"].items()},
+            "llm": dict(turno["llm"])
+        }
+
+def descartarTurno():
+    """
+    Desliga o rastreamento no contexto atual sem registrar o turno (ex: o Whisper não ouviu nada)
+    """
+    _turno_atual.set(None)
+
+def _rotulos(rotulos: dict) -> str:
+    return "{" + ",".join(f'{chave}="{valor}"' for chave, valor in rotulos.items()) + "}" if rotulos else ""
+
+def linhasGauge(nome: str, ajuda: str, valores: list) -> list:
+    """
+    Linhas de um gauge no formato de texto do Prometheus. valores: lista de (rótulos, valor)
+    """
+    linhas = [f"# HELP {nome} {ajuda}", f"# TYPE {nome} gauge"]
+    linhas.extend(f"{nome}{_rotulos(rotulos)} {valor}" for rotulos, valor in valores)
+    return linhas
+
+def textoPrometheus() -> str:
+    """
+    Histogramas das etapas, percentis recentes e contadores do LLM no formato de texto do Prometheus
+    """
+    with _lock:
+        linhas = ["# HELP virtkino_etapa_segundos Duração de cada etapa do turno", "# TYPE virtkino_etapa_segundos histogram"]
+        for etapa, histograma in sorted(_histogramas.items()):
+            acumulado = 0
+            for limite, contagem in zip(BUCKETS_SEGUNDOS + ("+Inf",), histograma.buckets):
+                acumulado += contagem
+                linhas.append(f'virtkino_etapa_segundos_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+            linhas.append(f'virtkino_etapa_segundos_sum{{etapa="{etapa}"}} {histograma.soma:.6f}')
+            linhas.append(f'virtkino_etapa_segundos_count{{etapa="{etapa}"}} {histograma.contagem}')
+
+        linhas += ["# HELP virtkino_etapa_percentil_segundos Percentis das últimas durações de cada etapa",
+                   "# TYPE virtkino_etapa_percentil_segundos gauge"]
+        for etapa, histograma in sorted(_histogramas.items()):
+            for percentil, valor in histograma.percentis().items():
+                linhas.append(f'virtkino_etapa_percentil_segundos{{etapa="{etapa}",quantile="{percentil}"}} {valor:.6f}')
+
+        for nome, valor in _contadores.items():
+            linhas += [f"# TYPE virtkino_{nome}_total counter", f"virtkino_{nome}_total {valor}"]
+    return "\n".join(linhas) + "\n"
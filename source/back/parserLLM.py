@@ -1,11 +1,49 @@
-import ollama
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import threading
 import json
+import os
 
-def extrairFiltros(texto_usuario: str, max_retries: int = 2) -> dict:
-    """
-    Extrai tags da mensagem do usuário usando um modelo LLM
-    """
-    prompt_sistema = """
+from source.back.classificadorRapido import preClassificar
+from source.back.clienteLLM import chat
+from source.back.executor import ocupacaoEtapas
+from source.back.metricas import medirEtapa, registrarChamadaLLM
+
+# "combinado": intenção e filtros numa única chamada ao LLM (com fallback para o modo separado)
+# "separado": classificarIntencao e depois extrairFiltros, duas chamadas
+# "especulativo": as duas chamadas do modo separado ao mesmo tempo; a extração é descartada se for conversa
+MODO_PARSER = os.getenv("VIRTKINO_MODO_PARSER", "combinado")
+MAX_ESPECULACOES = int(os.getenv("VIRTKINO_MAX_ESPECULACOES", "2")) # Extrações especulativas em voo (0 desliga)
+
+# Extrações especulativas rodam neste pool, em paralelo à classificação
+_pool_especulacao = ThreadPoolExecutor(max_workers=max(MAX_ESPECULACOES, 1), thread_name_prefix="virtkino-especulacao")
+_vagas_especulacao = threading.BoundedSemaphore(max(MAX_ESPECULACOES, 1))
+_lock_especulacao = threading.Lock()
+estatisticas_especulacao = {"lancadas": 0, "aproveitadas": 0, "descartadas": 0, "recusadas": 0}
+
+# Schema do modo combinado, enviado como structured output para o Ollama
+SCHEMA_INTERPRETACAO = {
+    "type": "object",
+    "properties": {
+        "intencao": {"type": "string", "enum": ["filme", "conversa"]},
+        "filtros": {
+            "type": "object",
+            "properties": {
+                "genero": {"type": "string"},
+                "palavras_chave": {"type": "array", "items": {"type": "string"}},
+                "ano_minimo": {"type": "integer"},
+                "ano_maximo": {"type": "integer"},
+                "duracao_minima": {"type": "integer"},
+                "duracao_maxima": {"type": "integer"},
+                "idioma": {"type": "string"}
+            }
+        }
+    },
+    "required": ["intencao", "filtros"]
+}
+
+# Prompts de sistema fixos: vão sempre no início das mensagens, idênticos, para o Ollama reaproveitar o prefixo
+PROMPT_EXTRACAO = """
     Você é um assistente especializado em recomendação de filmes chamado virtKino.
     Sua tarefa é analisar o texto do usuário (em Português) e extrair critérios de busca para um banco de dados em INGLÊS.
     
@@ -22,23 +60,94 @@ def extrairFiltros(texto_usuario: str, max_retries: int = 2) -> dict:
     - "palavras_chave": lista de strings (EM INGLÊS).
     - "ano_minimo": inteiro.
     - "ano_maximo": inteiro.
+    - "duracao_minima": inteiro, em minutos (só se o usuário falar da duração).
+    - "duracao_maxima": inteiro, em minutos (ex: "filme curto" => 100).
+    - "idioma": código ISO 639-1 do idioma original do filme (ex: "fr" para filme francês, "ja" para japonês).
 
     Exemplos:
     - User: "filme de terror com zumbis"
       JSON: {"genero": "Terror", "palavras_chave": ["zombies", "undead"]}
     - User: "comédia romântica anos 90"
       JSON: {"genero": "Comédia", "palavras_chave": ["romance", "love"], "ano_minimo": 1990, "ano_maximo": 1999}
+    - User: "um drama francês curtinho"
+      JSON: {"genero": "Drama", "idioma": "fr", "duracao_maxima": 100}
+    """
+
+PROMPT_CLASSIFICACAO = """
+    Sua única tarefa é classificar a intenção do usuário.
+    Responda APENAS com UMA palavra: 'filme' ou 'conversa'.
+
+    - Responda 'filme' se o usuário estiver pedindo uma recomendação de filme, procurando por um filme, ou falando sobre que tipo de filme ele quer assistir.
+    - Responda 'conversa' para todo o resto (saudações, despedidas, perguntas aleatórias, como você está, etc.).
+    - Se o usuário estiver perguntando sobre sua opinião do que você acha do filme ou de um filme, responda 'conversa'.
+
+    Exemplos:
+    Usuário: "Oi, tudo bem?" -> conversa
+    Usuário: "Me recomenda um filme de ação" -> filme
+    Usuário: "Qual a capital do Brasil?" -> conversa
+    Usuário: "Quero algo de terror bem antigo" -> filme
+    Usuário: "Obrigado!" -> conversa
+    Usuário: "O que você acha deste filme?" -> conversa
     """
 
+PROMPT_INTERPRETACAO = """
+    Você é um assistente especializado em recomendação de filmes chamado virtKino.
+    Sua tarefa é analisar o texto do usuário (em Português), classificar a intenção e, se for um pedido de filme,
+    extrair critérios de busca para um banco de dados em INGLÊS.
+
+    Você DEVE responder APENAS com um objeto JSON válido, no formato:
+    {"intencao": "filme" ou "conversa", "filtros": {...}}
+
+    INTENÇÃO:
+    - "filme" se o usuário estiver pedindo uma recomendação de filme, procurando por um filme, ou falando sobre que tipo de filme ele quer assistir.
+    - "conversa" para todo o resto (saudações, despedidas, perguntas aleatórias, como você está, etc.).
+    - Se o usuário estiver perguntando sobre sua opinião do que você acha do filme ou de um filme, é "conversa".
+    - Se a intenção for "conversa", "filtros" deve ser {}.
+
+    REGRAS DE TRADUÇÃO OBRIGATÓRIAS PARA OS FILTROS:
+    1. "genero": Mantenha em Português (ex: "Ação", "Terror"). Nosso sistema traduzirá depois.
+    2. "palavras_chave": TRADUZA OBRIGATORIAMENTE PARA INGLÊS. O banco de dados só entende inglês.
+       Exemplo: Se o usuário pedir "robôs", você deve enviar ["robots", "androids"].
+
+    Os filtros podem conter:
+    - "genero": string (PT-BR).
+    - "palavras_chave": lista de strings (EM INGLÊS).
+    - "ano_minimo": inteiro.
+    - "ano_maximo": inteiro.
+    - "duracao_minima": inteiro, em minutos (só se o usuário falar da duração).
+    - "duracao_maxima": inteiro, em minutos (ex: "filme curto" => 100).
+    - "idioma": código ISO 639-1 do idioma original do filme (ex: "fr" para filme francês, "ja" para japonês).
+
+    Exemplos:
+    - User: "Oi, tudo bem?"
+      JSON: {"intencao": "conversa", "filtros": {}}
+    - User: "filme de terror com zumbis"
+      JSON: {"intencao": "filme", "filtros": {"genero": "Terror", "palavras_chave": ["zombies", "undead"]}}
+    - User: "comédia romântica anos 90"
+      JSON: {"intencao": "filme", "filtros": {"genero": "Comédia", "palavras_chave": ["romance", "love"], "ano_minimo": 1990, "ano_maximo": 1999}}
+    - User: "um drama francês curtinho"
+      JSON: {"intencao": "filme", "filtros": {"genero": "Drama", "idioma": "fr", "duracao_maxima": 100}}
+    - User: "O que você acha deste filme?"
+      JSON: {"intencao": "conversa", "filtros": {}}
+    """
+
+PROMPTS_PARSER = (PROMPT_EXTRACAO, PROMPT_CLASSIFICACAO, PROMPT_INTERPRETACAO)
+
+def extrairFiltros(texto_usuario: str, max_retries: int = 2) -> dict:
+    """
+    Extrai tags da mensagem do usuário usando um modelo LLM
+    """
     messages = [
-        {'role': 'system', 'content': prompt_sistema},
+        {'role': 'system', 'content': PROMPT_EXTRACAO},
         {'role': 'user', 'content': texto_usuario}
     ]
 
     print(f"[INFO] Enviando para o LLM: '{texto_usuario}'")
     for attempt in range(max_retries):
         try:
-            response = ollama.chat(model='llama3:8b', messages=messages, format='json')
+            with medirEtapa("extracao"):
+                response = chat(messages, format='json')
+            registrarChamadaLLM(response, attempt + 1)
             content_str = response['message']['content']
             # Decoding do json como validação
             filtros = json.loads(content_str)
@@ -65,30 +174,13 @@ def classificarIntencao(texto_usuario: str) -> str:
     """
     Classifica a intenção do usuário como 'filme' ou 'conversa'.
     """
-    prompt_sistema = """
-    Sua única tarefa é classificar a intenção do usuário.
-    Responda APENAS com UMA palavra: 'filme' ou 'conversa'.
-
-    - Responda 'filme' se o usuário estiver pedindo uma recomendação de filme, procurando por um filme, ou falando sobre que tipo de filme ele quer assistir.
-    - Responda 'conversa' para todo o resto (saudações, despedidas, perguntas aleatórias, como você está, etc.).
-    - Se o usuário estiver perguntando sobre sua opinião do que você acha do filme ou de um filme, responda 'conversa'.
-
-    Exemplos:
-    Usuário: "Oi, tudo bem?" -> conversa
-    Usuário: "Me recomenda um filme de ação" -> filme
-    Usuário: "Qual a capital do Brasil?" -> conversa
-    Usuário: "Quero algo de terror bem antigo" -> filme
-    Usuário: "Obrigado!" -> conversa
-    Usuário: "O que você acha deste filme?" -> conversa
-    """
     try:
-        response = ollama.chat(
-            model='llama3:8b',
-            messages=[
-                {'role': 'system', 'content': prompt_sistema},
+        with medirEtapa("classificacao"):
+            response = chat([
+                {'role': 'system', 'content': PROMPT_CLASSIFICACAO},
                 {'role': 'user', 'content': texto_usuario}
-            ]
-        )
+            ])
+        registrarChamadaLLM(response)
         # Limpa a resposta para garantir apenas uma palavra
         intencao = response['message']['content'].strip().lower()
         
@@ -101,6 +193,138 @@ def classificarIntencao(texto_usuario: str) -> str:
         print(f"[WARN] Erro ao classificar intenção: {e}")
         return "conversa" # Fallback, apenas tenta conversar
 
+def validarFiltros(filtros) -> dict:
+    """
+    Valida os filtros contra o schema, descartando chaves inválidas.\\
+    Retorna None se nem for um objeto
+    """
+    if not isinstance(filtros, dict): return None # type: ignore
+    validos = {}
+    if isinstance(filtros.get("genero"), str) and filtros["genero"].strip():
+        validos["genero"] = filtros["genero"].strip()
+    if isinstance(filtros.get("palavras_chave"), list):
+        palavras = [p.strip() for p in filtros["palavras_chave"] if isinstance(p, str) and p.strip()]
+        if palavras: validos["palavras_chave"] = palavras
+    for chave in ("ano_minimo", "ano_maximo", "duracao_minima", "duracao_maxima"):
+        try:
+            if filtros.get(chave) is not None: validos[chave] = int(float(filtros[chave]))
+        except (TypeError, ValueError, OverflowError): # OverflowError: 1e999 vira inf no json
+            pass
+    if isinstance(filtros.get("idioma"), str) and filtros["idioma"].strip():
+        validos["idioma"] = filtros["idioma"].strip().lower()
+    return validos
+
+def _extrairValidado(texto_usuario: str) -> dict:
+    """
+    extrairFiltros passando pelo mesmo schema do modo combinado, antes de chegar ao recomendador
+    """
+    return validarFiltros(extrairFiltros(texto_usuario)) or {}
+
+def _interpretarCombinado(texto_usuario: str, max_retries: int = 2):
+    """
+    Classifica a intenção e extrai os filtros numa única chamada estruturada ao LLM.\\
+    Retorna (intencao, filtros) ou None se o modelo não respeitar o schema
+    """
+    messages = [
+        {'role': 'system', 'content': PROMPT_INTERPRETACAO},
+        {'role': 'user', 'content': texto_usuario}
+    ]
+
+    for attempt in range(max_retries):
+        content_str = ""
+        try:
+            with medirEtapa("interpretacao"):
+                response = chat(messages, format=SCHEMA_INTERPRETACAO)
+            registrarChamadaLLM(response, attempt + 1)
+            content_str = response['message']['content']
+            dados = json.loads(content_str)
+            intencao = dados.get("intencao") if isinstance(dados, dict) else None
+            filtros = validarFiltros(dados.get("filtros", {})) if isinstance(dados, dict) else None
+            if intencao in ("filme", "conversa") and filtros is not None:
+                print(f"[INFO] LLM interpretou: {intencao} | {filtros}")
+                return intencao, filtros if intencao == "filme" else {}
+            print(f"[WARN] Resposta fora do schema na tentativa {attempt + 1}: {content_str}")
+        except (json.JSONDecodeError, TypeError) as e:
+            print(f"[WARN] Erro de JSON na tentativa {attempt + 1}: {e}")
+        except Exception as e:
+            print(f"[WARN] Erro na interpretação combinada: {e}")
+            return None
+
+        if attempt < max_retries - 1:
+            messages.append({'role': 'assistant', 'content': content_str})
+            messages.append({
+                'role': 'user',
+                'content': 'Sua resposta anterior não seguiu o formato pedido. Retorne APENAS o JSON com "intencao" e "filtros".'
+            })
+    return None
+
+def _contarEspeculacao(resultado: str):
+    with _lock_especulacao:
+        estatisticas_especulacao[resultado] += 1
+
+def _podeEspecular() -> bool:
+    """
+    Política de carga da especulação: só lança a extração extra se houver vaga
+    e ninguém estiver na fila da etapa do LLM (com o Ollama saturado, a chamada a mais só atrasaria os outros)
+    """
+    if MAX_ESPECULACOES <= 0 or ocupacaoEtapas()["llm"]["aguardando"] > 0:
+        return False
+    return _vagas_especulacao.acquire(blocking=False)
+
+def _interpretarEspeculativo(texto_usuario: str) -> tuple:
+    """
+    Classifica a intenção enquanto a extração de filtros já roda em outra thread.\\
+    Pedidos de filme custam a latência de uma chamada em vez de duas; em conversas a extração é cancelada
+    (se ainda não começou) ou tem o resultado descartado.\\
+    Sem vaga pela política de carga, faz as duas chamadas em sequência
+    """
+    if not _podeEspecular():
+        _contarEspeculacao("recusadas")
+        intencao = classificarIntencao(texto_usuario)
+        return intencao, _extrairValidado(texto_usuario) if intencao == "filme" else {}
+
+    _contarEspeculacao("lancadas")
+    # O contexto leva o turno atual, para a extração contar nos tempos e tokens dele
+    extracao = _pool_especulacao.submit(contextvars.copy_context().run, _extrairValidado, texto_usuario)
+    extracao.add_done_callback(lambda _: _vagas_especulacao.release())
+    intencao = classificarIntencao(texto_usuario)
+    if intencao == "filme":
+        _contarEspeculacao("aproveitadas")
+        return "filme", extracao.result()
+    extracao.cancel()
+    _contarEspeculacao("descartadas")
+    return "conversa", {}
+
+def interpretarTexto(texto_usuario: str, modo: str = None, usar_preclassificador: bool = True, detalhes: dict = None) -> tuple: # type: ignore
+    """
+    Ponto de entrada do parser: retorna (intencao, filtros).\\
+    Intenções óbvias são resolvidas pelo pré-classificador local, sem LLM.\\
+    Se 'detalhes' for passado, recebe em "origem" quem decidiu a intenção ("pre_classificador" ou "llm").\\
+    No modo "combinado" faz uma única chamada ao LLM; se ela falhar, cai para o modo "separado"
+    (classificarIntencao + extrairFiltros). No modo "especulativo" as duas rodam ao mesmo tempo
+    """
+    modo = modo or MODO_PARSER
+    with medirEtapa("preclassificador"):
+        intencao = preClassificar(texto_usuario) if usar_preclassificador else None
+    if detalhes is not None: detalhes["origem"] = "pre_classificador" if intencao else "llm"
+    if intencao == "conversa":
+        return "conversa", {}
+    if intencao == "filme":
+        return "filme", _extrairValidado(texto_usuario)
+
+    if modo == "combinado":
+        resultado = _interpretarCombinado(texto_usuario)
+        if resultado is not None:
+            return resultado
+        print("[WARN] Interpretação combinada falhou, usando o modo separado")
+    if modo == "especulativo":
+        return _interpretarEspeculativo(texto_usuario)
+
+    intencao = classificarIntencao(texto_usuario)
+    filtros = _extrairValidado(texto_usuario) if intencao == "filme" else {}
+    return intencao, filtros
+
 if __name__ == "__main__":
     print("[DEBUG] Teste do parser")
-    extrairFiltros("me recomende uma ficção científica com robôs que não seja muito antiga")
\ No newline at end of file
+    extrairFiltros("me recomende uma ficção científica com robôs que não seja muito antiga")
+    interpretarTexto("me recomende uma ficção científica com robôs que não seja muito antiga", modo="combinado")
\ No newline at end of file
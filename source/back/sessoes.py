@@ -0,0 +1,124 @@
+from collections import OrderedDict
+import threading
+import json
+import time
+import uuid
+import os
+import re
+
+# Limites das sessões
+MAX_MENSAGENS_SESSAO = 8 # Janela de contexto enviada ao LLM
+MAX_SESSOES = int(os.getenv("VIRTKINO_MAX_SESSOES", "1000"))
+TTL_SESSAO = float(os.getenv("VIRTKINO_TTL_SESSAO", "3600")) # Segundos sem uso até a sessão ser descartada
+ARQUIVO_SNAPSHOT = "logs/sessoes.json"
+
+REGEX_ID_SESSAO = re.compile(r"^[\w-]{8,64}$")
+
+class Sessao:
+    """
+    Estado de conversa de um cliente: a janela de histórico que vai para o LLM
+    """
+    def __init__(self, id_sessao: str, historico: list = None, ultimo_acesso: float = None, gerenciador=None): # type: ignore
+        self.id = id_sessao
+        self.historico = historico or []
+        self.ultimo_acesso = ultimo_acesso or time.time()
+        self.gerenciador = gerenciador # Quem guarda a sessão, para cada turno contar como acesso
+
+    def adicionar(self, *mensagens: dict):
+        """
+        Acrescenta mensagens ao histórico, mantendo só as últimas MAX_MENSAGENS_SESSAO.\\
+        Cada turno conta como acesso: a sessão vai para o fim da fila de TTL/LRU
+        """
+        self.historico.extend(mensagens)
+        if len(self.historico) > MAX_MENSAGENS_SESSAO:
+            del self.historico[:-MAX_MENSAGENS_SESSAO]
+        if self.gerenciador is not None:
+            self.gerenciador.tocar(self)
+
+class GerenciadorSessoes:
+    """
+    Sessões em memória, indexadas pelo id que o cliente manda ao conectar no WebSocket.\\
+    Descarta sessões ociosas por TTL e, acima de MAX_SESSOES, as menos usadas recentemente (LRU)
+    """
+    def __init__(self, max_sessoes: int = MAX_SESSOES, ttl: float = TTL_SESSAO):
+        self.max_sessoes = max_sessoes
+        self.ttl = ttl
+        self._sessoes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, id_sessao: str = None) -> Sessao: # type: ignore
+        """
+        Retorna a sessão do id (criando se não existir ou se o id for inválido)
+        """
+        if not id_sessao or not REGEX_ID_SESSAO.match(id_sessao):
+            id_sessao = uuid.uuid4().hex
+        with self._lock:
+            self._evictar()
+            sessao = self._sessoes.get(id_sessao)
+            if sessao is None:
+                sessao = Sessao(id_sessao, gerenciador=self)
+                self._sessoes[id_sessao] = sessao
+            self._sessoes.move_to_end(id_sessao)
+            sessao.ultimo_acesso = time.time()
+            return sessao
+
+    def tocar(self, sessao: Sessao):
+        """
+        Marca a sessão como usada agora, movendo-a para o fim do LRU.\\
+        Se ela já tinha sido descartada com o cliente ainda conectado, volta para o gerenciador
+        """
+        with self._lock:
+            sessao.ultimo_acesso = time.time()
+            if sessao.id not in self._sessoes:
+                # Como no obter: abre espaço antes de reinserir, para não passar de max_sessoes
+                self._evictar()
+            self._sessoes[sessao.id] = sessao
+            self._sessoes.move_to_end(sessao.id)
+
+    def _evictar(self):
+        # O OrderedDict fica em ordem de último acesso, as expiradas estão no começo
+        limite = time.time() - self.ttl
+        while self._sessoes:
+            mais_antiga = next(iter(self._sessoes.values()))
+            if mais_antiga.ultimo_acesso >= limite and len(self._sessoes) < self.max_sessoes:
+                break
+            self._sessoes.popitem(last=False)
+
+    def __len__(self):
+        return len(self._sessoes)
+
+    def salvarSnapshot(self, filepath: str = ARQUIVO_SNAPSHOT):
+        """
+        Salva as sessões em disco, para sobreviverem a um reload do servidor
+        """
+        with self._lock:
+            dados = {s.id: {"historico": s.historico, "ultimo_acesso": s.ultimo_acesso} for s in self._sessoes.values()}
+        try:
+            os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+            temporario = f"{filepath}.tmp"
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(dados, f, ensure_ascii=False)
+            os.replace(temporario, filepath)
+            print(f"[INFO] {len(dados)} sessões salvas em '{filepath}'")
+        except Exception as e:
+            print(f"[ERROR] Não foi possível salvar as sessões: {e}")
+
+    def carregarSnapshot(self, filepath: str = ARQUIVO_SNAPSHOT):
+        """
+        Restaura as sessões salvas, ignorando as que já expiraram
+        """
+        if not os.path.exists(filepath): return
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                dados = json.load(f)
+        except Exception as e:
+            print(f"[WARN] Snapshot de sessões inválido, ignorando: {e}")
+            return
+        with self._lock:
+            for id_sessao, sessao in sorted(dados.items(), key=lambda item: item[1]["ultimo_acesso"]):
+                self._sessoes[id_sessao] = Sessao(id_sessao, sessao["historico"][-MAX_MENSAGENS_SESSAO:], sessao["ultimo_acesso"], self)
+            self._evictar()
+        print(f"[INFO] {len(self._sessoes)} sessões restauradas de '{filepath}'")
+
+# Instância única usada pelo servidor
+sessoes = GerenciadorSessoes()
@@ -0,0 +1,68 @@
+import io
+
+from faster_whisper.audio import decode_audio
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+TAXA_AMOSTRAGEM = 16000 # Taxa usada pelo Whisper
+SILENCIO_ENDPOINT = 0.8 # Segundos de silêncio depois da fala para considerar que o usuário terminou
+OPCOES_VAD = VadOptions(min_silence_duration_ms=300, speech_pad_ms=100)
+
+class TranscritorIncremental:
+    """
+    Transcrição de uma fala que ainda está chegando em pedaços pelo WebSocket.\\
+    Os pedaços do MediaRecorder só são decodificáveis em conjunto, então cada passada parcial
+    decodifica o buffer inteiro, roda o VAD para detectar o fim da fala e transcreve com beam 1.\\
+    No fim da fala, textoEstavel() reaproveita a última parcial se ela já estabilizou;
+    senão o servidor manda o buffer para o AgendadorTranscricao, que agrupa as sessões
+    """
+    def __init__(self, model):
+        self.model = model
+        self.buffer = bytearray()
+        self.tamanho_processado = 0 # Bytes do buffer já vistos pela última passada parcial
+        self.parciais = []
+        self.encerrado = False # Não aceita mais pedaços (fim detectado pelo VAD ou pelo cliente)
+
+    def adicionar(self, pedaco: bytes):
+        if not self.encerrado:
+            self.buffer.extend(pedaco)
+
+    @property
+    def temAudioNovo(self) -> bool:
+        return len(self.buffer) > self.tamanho_processado
+
+    def _decodificar(self, dados: bytes):
+        return decode_audio(io.BytesIO(dados), sampling_rate=TAXA_AMOSTRAGEM)
+
+    def transcreverParcial(self) -> tuple:
+        """
+        Transcreve o que chegou até agora.\\
+        Retorna (texto parcial, True se o VAD detectou o fim da fala)
+        """
+        dados = bytes(self.buffer) # Cópia: o WebSocket continua acrescentando pedaços enquanto isso roda
+        self.tamanho_processado = len(dados)
+        try:
+            audio = self._decodificar(dados)
+        except Exception:
+            # O último pedaço pode estar truncado; espera o próximo
+            return "", False
+
+        falas = get_speech_timestamps(audio, OPCOES_VAD, sampling_rate=TAXA_AMOSTRAGEM)
+        if not falas:
+            return "", False
+        silencio_final = (len(audio) - falas[-1]["end"]) / TAXA_AMOSTRAGEM
+
+        segments, _ = self.model.transcribe(audio, language="pt", beam_size=1, vad_filter=True, condition_on_previous_text=False)
+        texto = " ".join([s.text for s in segments]).strip()
+        self.parciais.append(texto)
+        return texto, silencio_final >= SILENCIO_ENDPOINT
+
+    def textoEstavel(self):
+        """
+        Encerra a fala e retorna a última parcial se ela já estabilizou
+        (as duas últimas concordam e nenhum áudio novo chegou); senão None
+        """
+        self.encerrado = True
+        estavel = len(self.parciais) >= 2 and self.parciais[-1] == self.parciais[-2]
+        if estavel and not self.temAudioNovo:
+            return self.parciais[-1]
+        return None
@@ -4,6 +4,8 @@ import DebugPanel from './DebugPanel';
 
 const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
 const WS_URL = `${protocol}//${window.location.host}/ws`;
+const CHUNK_MS = 250; // Intervalo entre pedaços de áudio enviados durante a fala
+const SESSION_KEY = "virtkino-sessao"; // Id da sessão da conversa, reaproveitado ao reconectar
 const BASE_URL = ""; // Áudio é Relativo a origem
 
 function App() {
@@ -14,8 +16,11 @@ function App() {
   const [isRecording, setIsRecording] = useState(false);
 
   const mediaRecorderRef = useRef(null);
-  const audioChunksRef = useRef([]);
   const audioPlayerRef = useRef(new Audio());
+  const audioQueueRef = useRef([]); // Frases de áudio aguardando para tocar
+  const isPlayingRef = useRef(false);
+  const streamDoneRef = useRef(true); // true quando o servidor já mandou a resposta final
+  const partialTextRef = useRef("");
 
   // WebSocket
   useEffect(() => {
@@ -23,30 +28,72 @@ function App() {
     let reconnectTimeout = null;
 
     const connect = () => {
-      wsInstance = new WebSocket(WS_URL);
+      const sessionId = sessionStorage.getItem(SESSION_KEY);
+      wsInstance = new WebSocket(sessionId ? `${WS_URL}?sessao=${encodeURIComponent(sessionId)}` : WS_URL);
+
+      // Áudio chega como frame binário, logo depois do JSON que o anuncia
+      wsInstance.binaryType = "arraybuffer";
 
       wsInstance.onopen = () => {
         console.log("WS Conectado");
+        wsInstance.send(JSON.stringify({ tipo: "config", protocolo: "binario" }));
         setStatus("idle");
       };
 
       wsInstance.onmessage = (event) => {
+        if (typeof event.data !== "string") {
+          const audioBlob = new Blob([event.data], { type: "audio/mpeg" });
+          enqueueAudio(URL.createObjectURL(audioBlob));
+          return;
+        }
+
         const data = JSON.parse(event.data);
 
+        if (data.tipo === "sessao") {
+          sessionStorage.setItem(SESSION_KEY, data.id);
+        }
+
         if (data.tipo === "estado") {
           setStatus(data.valor);
         }
 
+        if (data.tipo === "transcricao" && data.parcial) {
+          // Transcrição parcial enquanto o usuário ainda fala
+          setChatText(`Você: "${data.texto}..."`);
+          return;
+        }
+
+        if (data.tipo === "endpoint") {
+          // O servidor detectou o fim da fala
+          stopRecording();
+          return;
+        }
+
         if (data.tipo === "transcricao") {
           setChatText(`Você: "${data.texto}"`);
+          // Novo turno: a resposta virá em partes
+          streamDoneRef.current = false;
+          audioQueueRef.current = [];
+          partialTextRef.current = "";
+        }
+
+        if (data.tipo === "resposta_parcial") {
+          partialTextRef.current = `${partialTextRef.current} ${data.texto}`.trim();
+          setChatText(`virtKino: "${partialTextRef.current}"`);
+          if (data.audio_url) enqueueAudio(`${BASE_URL}${data.audio_url}?t=${Date.now()}`);
         }
 
         if (data.tipo === "resposta") {
           setChatText(`virtKino: "${data.texto}"`);
           if (data.debug) setDebugData(data.debug);
-
-          const audioUrl = `${BASE_URL}${data.audio_url}?t=${Date.now()}`;
-          playAudio(audioUrl);
+          streamDoneRef.current = true;
+
+          if (data.streaming) {
+            // Os áudios já chegaram pelas respostas parciais
+            if (!isPlayingRef.current && audioQueueRef.current.length === 0) setStatus("idle");
+          } else if (data.audio_url) {
+            enqueueAudio(`${BASE_URL}${data.audio_url}?t=${Date.now()}`);
+          }
         }
       };
 
@@ -79,14 +126,32 @@ function App() {
   }, []);
 
   // Output de Audio
-  const playAudio = (url) => {
+  const enqueueAudio = (url) => {
+    audioQueueRef.current.push(url);
+    if (!isPlayingRef.current) playNext();
+  };
+
+  const playNext = () => {
+    // Libera o áudio binário que acabou de tocar
+    const previousUrl = audioPlayerRef.current.src;
+    if (previousUrl && previousUrl.startsWith("blob:")) URL.revokeObjectURL(previousUrl);
+
+    const url = audioQueueRef.current.shift();
+    if (!url) {
+      isPlayingRef.current = false;
+      // Só volta para idle quando a resposta inteira já tocou
+      if (streamDoneRef.current) setStatus("idle");
+      return;
+    }
+
+    isPlayingRef.current = true;
     setStatus("speaking");
     audioPlayerRef.current.src = url;
-    audioPlayerRef.current.play().catch(e => console.error("Erro play:", e));
-
-    audioPlayerRef.current.onended = () => {
-      setStatus("idle");
-    };
+    audioPlayerRef.current.onended = playNext;
+    audioPlayerRef.current.play().catch(e => {
+      console.error("Erro play:", e);
+      playNext();
+    });
   };
 
   // Input de Audio
@@ -96,18 +161,19 @@ function App() {
     try {
       const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
       mediaRecorderRef.current = new MediaRecorder(stream);
-      audioChunksRef.current = [];
+
+      // Transcrição incremental: os pedaços vão para o servidor enquanto o usuário fala
+      sendControl({ tipo: "inicio_fala" });
 
       mediaRecorderRef.current.ondataavailable = (event) => {
-        audioChunksRef.current.push(event.data);
+        if (event.data.size > 0) sendAudio(event.data);
       };
 
       mediaRecorderRef.current.onstop = () => {
-        const audioBlob = new Blob(audioChunksRef.current, { type: 'audio/webm' });
-        sendAudio(audioBlob);
+        sendControl({ tipo: "fim_fala" });
       };
 
-      mediaRecorderRef.current.start();
+      mediaRecorderRef.current.start(CHUNK_MS);
       setIsRecording(true);
       setStatus("listening");
       setChatText("...");
@@ -125,15 +191,17 @@ function App() {
     }
   };
 
+  const sendControl = (message) => {
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify(message));
+    }
+  };
+
   const sendAudio = (blob) => {
-    const reader = new FileReader();
-    reader.readAsDataURL(blob);
-    reader.onloadend = () => {
-      const base64Audio = reader.result.split(',')[1];
-      if (socket && socket.readyState === WebSocket.OPEN) {
-        socket.send(JSON.stringify({ audio_data: base64Audio }));
-      }
-    };
+    // Envia o áudio cru num frame binário (sem base64)
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      socket.send(blob);
+    }
   };
 
   // Render
@@ -1,7 +1,7 @@
 import React from 'react';
 
 const DebugPanel = ({ data }) => {
-  const { intencao, filtros_extraidos, filmes_encontrados, filme_selecionado } = data || {};
+  const { intencao, filtros_extraidos, filmes_encontrados, filme_selecionado, tempos } = data || {};
 
   return (
     <div className="debug-panel">
@@ -34,6 +34,18 @@ const DebugPanel = ({ data }) => {
           </div>
         </div>
       )}
+
+      {tempos && (
+        <div className="debug-section">
+          <span className="debug-label">LATÊNCIA DO TURNO ({tempos.total_ms} ms)</span>
+          <div className="json-block">
+            {Object.entries(tempos.etapas_ms).map(([etapa, ms]) => (
+              <div key={etapa}>{etapa}: {ms} ms</div>
+            ))}
+            LLM: {tempos.llm.chamadas} chamadas, {tempos.llm.tokens_prompt}+{tempos.llm.tokens_resposta} tokens
+          </div>
+        </div>
+      )}
     </div>
   );
 };